@@ -1,34 +1,132 @@
-import random
-import torch
+import hashlib
+import os
 import numpy as np
-from train_ai import DQN
+from dice import default_source
+from solver import solve_policy, policy_action, save_policy_table, load_policy_table
 
-def roll_die(sides):
-    return random.randint(1, sides)
+# --- Torch-free DQN inference ---
+
+def load_weights(model_path):
+    """
+    Load DQN weights as NumPy arrays keyed like the DQN state_dict.
+    .npz files (see export_model_npz) are read without importing torch.
+    """
+    if model_path.endswith(".npz"):
+        with np.load(model_path) as data:
+            return {name: data[name] for name in data.files}
+    import torch
+    state_dict = torch.load(model_path, map_location=torch.device('cpu'))
+    return {name: tensor.numpy() for name, tensor in state_dict.items()}
+
+
+def export_model_npz(model_path, npz_path=None):
+    # Convert a DQN state_dict checkpoint to a .npz file for torch-free serving
+    if npz_path is None:
+        npz_path = os.path.splitext(model_path)[0] + ".npz"
+    np.savez(npz_path, **load_weights(model_path))
+    return npz_path
+
+
+def dqn_forward(weights, states):
+    # DQN.net in NumPy: Linear -> ReLU -> Linear -> ReLU -> Linear
+    x = np.maximum(states @ weights["net.0.weight"].T + weights["net.0.bias"], 0)
+    x = np.maximum(x @ weights["net.2.weight"].T + weights["net.2.bias"], 0)
+    return x @ weights["net.4.weight"].T + weights["net.4.bias"]
 
-def roll_dice(dice):
-    return [roll_die(d) for d in dice]
 
 class BattleDiceAIPlayer:
-    def __init__(self, dice_types, target, model_path, max_rerolls=3):
+    def __init__(self, dice_types, target, model_path=None, max_rerolls=3, policy_table=None, dice_source=None,
+                 cache_dir=None, response_table=None, rerolls_scale=None):
+        self.dice_source = dice_source or default_source()
         self.dice_types = dice_types
         self.target = target
+        # max_rerolls sizes the policy tables; rerolls_scale is what the training envs divide
+        # rerolls_left by (the larger reroll budget, see train_ai.BattleDiceEnv)
         self.max_rerolls = max_rerolls
-        self.model = DQN(input_dim=8, output_dim=4)
-        self.model.load_state_dict(torch.load(model_path, map_location=torch.device('cpu')))
-        self.model.eval()
+        self.rerolls_scale = rerolls_scale or max_rerolls
         self.max_side = max(dice_types)
+        self.cache_dir = cache_dir
+        self.weights = None
+        self.policy_table = policy_table
+        # Exact second-mover table (see solver.solve_response_policy), used when the opponent's sum is known
+        self.response_table = response_table
+        if model_path is not None:
+            self.weights = load_weights(model_path)
+            # The network must match this collection: rolls, dice, rerolls and target in, one action per die + stop out
+            n = len(dice_types)
+            if self.weights["net.0.weight"].shape[1] != 2 * n + 2 or self.weights["net.4.weight"].shape[0] != n + 1:
+                raise ValueError(f"Model {model_path} does not fit a collection of {n} dice")
+            if policy_table is None:
+                self.policy_table = self.load_compiled_policy(model_path)
+        elif policy_table is None:
+            # No model given: use the exact optimal policy instead
+            self.policy_table, _ = solve_policy(dice_types, target, max_rerolls)
+
+    @classmethod
+    def from_registry(cls, collection_key, tag="latest", dice_source=None):
+        # The collection's model tagged `tag` in the model registry (see registry.ModelRegistry)
+        from registry import load_ai_player
+        return load_ai_player(collection_key, dice_source=dice_source, tag=tag)
 
     def get_state(self, rolls, rerolls_left):
         rolls_norm = [r / self.max_side for r in rolls]
-        rerolls_norm = [rerolls_left / self.max_rerolls]
+        rerolls_norm = [rerolls_left / self.rerolls_scale]
         dice_norm = [d / self.max_side for d in self.dice_types]
         target_norm = [self.target / (self.max_side * len(self.dice_types))]
         state = np.array(rolls_norm + rerolls_norm + dice_norm + target_norm, dtype=np.float32)
         return state
 
-    def play_turn(self, player_name, dice_types, rerolls):
-        rolls = roll_dice(dice_types)
+    def get_states(self, rolls, rerolls_left):
+        # Batched get_state: rolls is (N, n_dice), rerolls_left is (N,)
+        n = len(self.dice_types)
+        states = np.empty((len(rolls), 2 * n + 2), dtype=np.float32)
+        states[:, :n] = np.asarray(rolls) / self.max_side
+        states[:, n] = np.asarray(rerolls_left) / self.rerolls_scale
+        states[:, n + 1:n + 1 + n] = np.asarray(self.dice_types) / self.max_side
+        states[:, -1] = self.target / (self.max_side * n)
+        return states
+
+    def compile_policy(self):
+        # Run the DQN once over every (rolls, rerolls_left) state and keep the argmax actions
+        shape = tuple(self.dice_types) + (self.max_rerolls + 1,)
+        grid = np.indices(shape).reshape(len(shape), -1).T
+        states = self.get_states(grid[:, :-1] + 1, grid[:, -1])
+        actions = dqn_forward(self.weights, states).argmax(1)
+        policy = actions.astype(np.int8).reshape(shape)
+        # No decision is made without rerolls left
+        policy[..., 0] = len(self.dice_types)
+        return policy
+
+    def weights_digest(self):
+        h = hashlib.sha256()
+        for name, array in sorted(self.weights.items()):
+            h.update(name.encode())
+            h.update(np.ascontiguousarray(array).tobytes())
+        h.update(repr((list(self.dice_types), self.target, self.max_rerolls, self.rerolls_scale)).encode())
+        return h.hexdigest()[:16]
+
+    def load_compiled_policy(self, model_path):
+        # Compiled tables are cached next to the model (or in cache_dir), keyed by a hash of the weights
+        if self.cache_dir is not None:
+            cache_path = os.path.join(self.cache_dir, f"policy_dqn_{self.weights_digest()}.npz")
+        else:
+            cache_path = f"{os.path.splitext(model_path)[0]}_policy_{self.weights_digest()}.npz"
+        if os.path.exists(cache_path):
+            return load_policy_table(cache_path, self.dice_types, self.target)
+        policy = self.compile_policy()
+        try:
+            save_policy_table(cache_path, policy, self.dice_types, self.target)
+        except OSError:
+            pass  # Read-only model directory: keep the table in memory only
+        return policy
+
+    def choose_action(self, rolls, rerolls_left, opponent_sum=None):
+        if opponent_sum is not None and self.response_table is not None:
+            return int(self.response_table[(opponent_sum,) + tuple(r - 1 for r in rolls) + (rerolls_left,)])
+        return policy_action(self.policy_table, rolls, rerolls_left)
+
+    def play_turn(self, player_name, dice_types, rerolls, opponent_sum=None):
+        rolls = self.dice_source.roll_dice(dice_types)
         log = [{
             "roll": rolls[:],
             "dice": dice_types,
@@ -37,15 +135,11 @@ class BattleDiceAIPlayer:
         }]
         rerolls_left = rerolls
         while rerolls_left > 0:
-            state = self.get_state(rolls, rerolls_left)
-            state_t = torch.tensor(state, dtype=torch.float32).unsqueeze(0)
-            with torch.no_grad():
-                q_values = self.model(state_t)
-                action = q_values.argmax().item()
-            if action == 3:
+            action = self.choose_action(rolls, rerolls_left, opponent_sum)
+            if action == len(dice_types):
                 break
             old_val = rolls[action]
-            rolls[action] = roll_die(dice_types[action])
+            rolls[action] = self.dice_source.roll(dice_types[action])
             rerolls_left -= 1
             log.append({
                 "roll": rolls[:],
@@ -59,3 +153,48 @@ class BattleDiceAIPlayer:
                 }
             })
         return rolls, sum(rolls), log
+
+    def play_turns(self, n, rerolls, with_logs=False, opponent_sums=None):
+        """
+        Play n independent turns in lockstep with the player's dice.
+        All still-active turns are decided with one table lookup per reroll
+        depth, in the response table when opponent_sums (one per turn) are
+        given. Returns (rolls of shape (n, n_dice), sums, logs), logs being
+        play_turn-style step lists when with_logs is set and None otherwise.
+        """
+        dice_types = self.dice_types
+        sides = np.asarray(dice_types)
+        rng = self.dice_source.rng
+        rolls = rng.integers(1, sides + 1, size=(n, len(dice_types)))
+        if with_logs:
+            logs = [[{"roll": r, "dice": dice_types, "sum": sum(r), "rerolls_left": rerolls}]
+                    for r in rolls.tolist()]
+        active = np.arange(n)
+        respond = opponent_sums is not None and self.response_table is not None
+        if respond:
+            opponent_sums = np.asarray(opponent_sums)
+        for rerolls_left in range(rerolls, 0, -1):
+            if respond:
+                actions = self.response_table[(opponent_sums[active],) + tuple((rolls[active] - 1).T) + (rerolls_left,)]
+            else:
+                actions = self.policy_table[tuple((rolls[active] - 1).T) + (rerolls_left,)]
+            keep = actions != len(dice_types)
+            active, actions = active[keep], actions[keep].astype(np.int64)
+            if not len(active):
+                break
+            old_vals = rolls[active, actions]
+            rolls[active, actions] = rng.integers(1, sides[actions] + 1)
+            if with_logs:
+                for i, index, old_val, row in zip(active.tolist(), actions.tolist(), old_vals.tolist(),
+                                                  rolls[active].tolist()):
+                    logs[i].append({"roll": row, "dice": dice_types, "sum": sum(row),
+                                    "rerolls_left": rerolls_left - 1,
+                                    "reroll_info": {"index": index, "old": old_val, "new": row[index]}})
+        return rolls, rolls.sum(axis=1), logs if with_logs else None
+
+
+if __name__ == "__main__":
+    # Export DQN checkpoints to .npz: python ai_player.py battle_dice_dqn_A.pth ...
+    import sys
+    for path in sys.argv[1:]:
+        print(f"Exported {path} to {export_model_npz(path)}")
@@ -0,0 +1,153 @@
+import argparse
+import numpy as np
+from solver import score_values, sum_grid
+from tournament import ROUNDS, REROLLS_FIRST, REROLLS_SECOND
+
+# --- Exact outcome analysis ---
+#
+# Final-sum distributions are computed by pushing probability mass through the
+# (rolls, rerolls_left) states of a policy table instead of sampling games.
+
+
+def tabulate_policy(policy, dice_types, max_rerolls):
+    """
+    Action probabilities of shape (*dice_types, max_rerolls + 1, n_dice + 1)
+    for a policy: an int policy table (see solver.solve_policy), a player
+    carrying one, or any object with choose_action. Stochastic policies
+    expose action_probabilities(rolls, rerolls_left) instead.
+    """
+    n = len(dice_types)
+    table = policy if isinstance(policy, np.ndarray) else getattr(policy, "policy_table", None)
+    if table is not None and table.shape[-1] > max_rerolls:
+        return np.eye(n + 1)[table[..., :max_rerolls + 1]]
+    probs = np.zeros(tuple(dice_types) + (max_rerolls + 1, n + 1))
+    probs[..., 0, n] = 1.0
+    for index in np.ndindex(*dice_types):
+        rolls = [i + 1 for i in index]
+        for rerolls_left in range(1, max_rerolls + 1):
+            if hasattr(policy, "action_probabilities"):
+                probs[index + (rerolls_left,)] = policy.action_probabilities(list(rolls), rerolls_left)
+            else:
+                probs[index + (rerolls_left, policy.choose_action(list(rolls), rerolls_left))] = 1.0
+    return probs
+
+
+def final_sum_distribution(policy_probs, dice_types, rerolls):
+    # P(final sum == s) for s in 0..sum(dice_types), starting from a fresh roll
+    sums = sum_grid(dice_types).ravel()
+    minlength = sum(dice_types) + 1
+    n = len(dice_types)
+    mass = np.full(tuple(dice_types), 1.0 / np.prod(dice_types))
+    dist = np.zeros(minlength)
+    for k in range(rerolls, 0, -1):
+        probs = policy_probs[..., k, :]
+        dist += np.bincount(sums, weights=(mass * probs[..., n]).ravel(), minlength=minlength)
+        next_mass = np.zeros_like(mass)
+        for axis, sides in enumerate(dice_types):
+            # Rerolling a die spreads its mass evenly over that die's faces
+            moving = mass * probs[..., axis]
+            next_mass += moving.sum(axis=axis, keepdims=True) / sides
+        mass = next_mass
+    dist += np.bincount(sums, weights=mass.ravel(), minlength=minlength)
+    return dist
+
+
+def score_distribution(dist, dice_types, target):
+    # Collapse a final-sum distribution onto determine_round_winner scores (-1 = bust)
+    scores = score_values(dice_types, target).astype(np.int64)
+    return np.bincount(scores + 1, weights=dist, minlength=target + 2)
+
+
+def round_probabilities(dist_1, dist_2, dice_types, target):
+    # (P(player 1 wins), P(draw), P(player 2 wins)) for one round
+    s1 = score_distribution(dist_1, dice_types, target)
+    s2 = score_distribution(dist_2, dice_types, target)
+    joint = np.outer(s1, s2)
+    return float(np.tril(joint, -1).sum()), float(np.trace(joint)), float(np.triu(joint, 1).sum())
+
+
+def second_mover_round(dist_first, policy, probs, dice_types, target, rerolls, max_rerolls):
+    """
+    One round between a first mover ending on dist_first and policy moving
+    second with `rerolls`. Policies with a response_table best-reply to each
+    first-mover sum; others play probs regardless. Returns the round's
+    (P(first wins), P(draw), P(second wins)) and the second mover's final-sum
+    distribution.
+    """
+    response = getattr(policy, "response_table", None)
+    if response is None:
+        dist_second = final_sum_distribution(probs, dice_types, rerolls)
+        return round_probabilities(dist_first, dist_second, dice_types, target), dist_second
+    # Second mover's final-sum distribution given each first-mover sum
+    conditional = np.zeros((len(dist_first), len(dist_first)))
+    for opponent_sum in np.flatnonzero(dist_first):
+        conditional[opponent_sum] = final_sum_distribution(
+            tabulate_policy(response[opponent_sum], dice_types, max_rerolls), dice_types, rerolls)
+    joint = dist_first[:, None] * conditional
+    scores = score_values(dice_types, target)
+    first_ahead = scores[:, None] - scores[None, :]
+    round_probs = (float(joint[first_ahead > 0].sum()), float(joint[first_ahead == 0].sum()),
+                   float(joint[first_ahead < 0].sum()))
+    return round_probs, joint.sum(axis=0)
+
+
+def match_probabilities(policy_1, policy_2, dice_types, target, rerolls=(REROLLS_FIRST, REROLLS_SECOND)):
+    """
+    Exact outcome of a full play_game match between two policies, player 1
+    moving first in odd rounds. A policy with a response_table uses it when
+    moving second (see second_mover_round). Returns per-round and match
+    probabilities from player 1's point of view.
+    """
+    rerolls_first, rerolls_second = rerolls
+    policies = (policy_1, policy_2)
+    tables = [tabulate_policy(p, dice_types, max(rerolls)) for p in policies]
+    first = [final_sum_distribution(t, dice_types, rerolls_first) for t in tables]
+    round_as_first, second_2 = second_mover_round(first[0], policy_2, tables[1], dice_types, target,
+                                                  rerolls_second, max(rerolls))
+    (loss, draw, win), second_1 = second_mover_round(first[1], policy_1, tables[0], dice_types, target,
+                                                     rerolls_second, max(rerolls))
+    round_as_second = (win, draw, loss)
+    second = [second_1, second_2]
+
+    # Distribution of player 1's point lead; each round moves it by +2, 0 or -2
+    lead = np.zeros(4 * ROUNDS + 1)
+    lead[2 * ROUNDS] = 1.0
+    for round_num in range(ROUNDS):
+        win, draw, loss = round_as_first if round_num % 2 == 0 else round_as_second
+        lead = win * np.roll(lead, 2) + draw * lead + loss * np.roll(lead, -2)
+    return {
+        "final_sum_first": first,
+        "final_sum_second": second,
+        "round_as_first": round_as_first,
+        "round_as_second": round_as_second,
+        "match": (float(lead[2 * ROUNDS + 1:].sum()), float(lead[2 * ROUNDS]), float(lead[:2 * ROUNDS].sum())),
+    }
+
+
+if __name__ == "__main__":
+    from battle_dice import COLLECTIONS
+    from policies import make_policy
+    parser = argparse.ArgumentParser(description="Exact Battle Dice win probabilities between two policies.")
+    parser.add_argument("policy_1", help='"heuristic", "random", "table", "response" or "dqn:<model_path>"')
+    parser.add_argument("policy_2", help="same choices as policy_1")
+    parser.add_argument("--collection", default="A", choices=sorted(COLLECTIONS))
+    args = parser.parse_args()
+
+    collection = COLLECTIONS[args.collection]
+    dice_types, target, rerolls = collection["dice"], collection["target"], collection["rerolls"]
+
+    def build():
+        return match_probabilities(make_policy(args.policy_1, dice_types, target, max(rerolls)),
+                                   make_policy(args.policy_2, dice_types, target, max(rerolls)),
+                                   dice_types, target, rerolls)
+    if args.policy_1.startswith("dqn:") or args.policy_2.startswith("dqn:"):
+        result = build()
+    else:
+        # Built-in policies depend only on the collection, so their results are cached;
+        # match2_ entries replace match_ ones, which scored "response" without its response table
+        from registry import ArtifactCache
+        result = ArtifactCache().arrays(collection, f"match2_{args.policy_1}_vs_{args.policy_2}", build)
+    print(f"{args.policy_1} vs {args.policy_2} on Collection {args.collection}")
+    for name in ("round_as_first", "round_as_second", "match"):
+        win, draw, loss = result[name]
+        print(f"  {name:<16} win {win:.4f}  draw {draw:.4f}  loss {loss:.4f}")
@@ -1,19 +1,11 @@
-import random
-import json
-import torch  # Add this import for AI
-from ai_player import BattleDiceAIPlayer  # Add this import for AI
+import secrets
+import dice
+from dice import roll_die, roll_dice
+from game_log import open_log_sink
+from registry import load_collections
 
-# Dice collection definitions
-COLLECTIONS = {
-    "A": {"dice": [4, 8, 12], "target": 14},
-    "B": {"dice": [6, 10, 20], "target": 21}
-}
-
-def roll_die(sides):
-    return random.randint(1, sides)
-
-def roll_dice(dice):
-    return [roll_die(d) for d in dice]
+# Dice collection definitions, see dice_collections.json
+COLLECTIONS = load_collections()
 
 def get_sum(rolls):
     return sum(rolls)
@@ -24,10 +16,10 @@ def reroll_choice_manual(player_name, rolls, dice_types, rerolls_left):
         dice_str = ', '.join([f'd{dice_types[i]}: {rolls[i]}' for i in range(len(rolls))])
         print(f"\n{player_name}, current rolls: {dice_str}, sum = {get_sum(rolls)}")
         print(f"You have {rerolls_left} rerolls left.")
-        reroll_input = input("Enter index of die to reroll (0-2), or 'n' to stop: ").strip()
+        reroll_input = input(f"Enter index of die to reroll (0-{len(rolls) - 1}), or 'n' to stop: ").strip()
         if reroll_input.lower() == 'n':
             break
-        if reroll_input not in ['0', '1', '2']:
+        if reroll_input not in [str(i) for i in range(len(rolls))]:
             print("Invalid input. Try again.")
             continue
 
@@ -38,6 +30,7 @@ def reroll_choice_manual(player_name, rolls, dice_types, rerolls_left):
         rerolls_left -= 1
 
         log.append({
+            "roll": rolls[:],
             "reroll_index": index,
             "old_val": old_val,
             "new_val": new_val,
@@ -61,9 +54,9 @@ def play_turn_manual(player_name, dice_types, rerolls):
 
     for step in reroll_log:
         log.append({
-            "roll": rerolled[:],
+            "roll": step["roll"],
             "dice": dice_types,
-            "sum": get_sum(rerolled),
+            "sum": step["current_sum"],
             "rerolls_left": step["rerolls_left"],
             "reroll_info": {
                 "index": step["reroll_index"],
@@ -86,9 +79,9 @@ def determine_round_winner(sum_p1, sum_p2, target):
 def choose_collection():
     while True:
         print("Choose dice collection:")
-        print("A: d4, d8, d12 — aim ≤ 14")
-        print("B: d6, d10, d20 — aim ≤ 21")
-        choice = input("Enter A or B: ").strip().upper()
+        for key, collection in COLLECTIONS.items():
+            print(f"{key}: {', '.join(f'd{sides}' for sides in collection['dice'])} — aim ≤ {collection['target']}")
+        choice = input(f"Enter {' or '.join(COLLECTIONS)}: ").strip().upper()
         if choice in COLLECTIONS:
             return COLLECTIONS[choice], choice
         print("Invalid choice. Try again.")
@@ -97,8 +90,12 @@ def print_rolls_with_types(rolls, dice_types):
     roll_str = ', '.join([f'd{dice_types[i]}: {rolls[i]}' for i in range(len(rolls))])
     print(f"Rolls: {roll_str}")
 
-def play_game():
+def play_game(log_path="battle_dice_pvp_log.jsonl", seed=None, response=True):
     print("=== BATTLE DICE PvP ===")
+    # Every game is seeded and the seed logged, so its dice can be reproduced with --seed
+    if seed is None:
+        seed = secrets.randbits(32)
+    dice.seed(seed)
     collection, coll_key = choose_collection()
     dice_types = collection["dice"]
     target = collection["target"]
@@ -107,16 +104,18 @@ def play_game():
     mode = input("Play vs (1) Human or (2) AI? Enter 1 or 2: ").strip()
     use_ai = (mode == '2')
     if use_ai:
-        ai_model_path = f"battle_dice_dqn_{coll_key}.pth"
-        ai_player = BattleDiceAIPlayer(dice_types, target, ai_model_path, max_rerolls=3)
+        # The AI stack is only imported for AI games; without a trained model
+        # the exact optimal policy is used instead. Moving second, the AI
+        # best-replies to Player 1's final sum unless response is off
+        from registry import load_ai_player
+        ai_player = load_ai_player(coll_key, COLLECTIONS, response=response)
 
-    print(f"\nBoth players will use Collection {coll_key} — Target: {target}")
+    print(f"\nBoth players will use Collection {coll_key} — Target: {target} (seed {seed})")
 
-    game_log = {
-        "collection": coll_key,
-        "rounds": [],
-        "final_score": {"Player 1": 0, "Player 2": 0}
-    }
+    # Rounds are written to the log as they complete
+    log_sink = open_log_sink(log_path, max_rerolls=max(collection["rerolls"]))
+    log_sink.start_game(coll_key, dice_types, target, seed=seed)
+    final_score = {"Player 1": 0, "Player 2": 0}
 
     # Alternating player order
     player_order = ["Player 1", "Player 2"]
@@ -125,8 +124,8 @@ def play_game():
         print(f"\n--- Round {round_num} ---")
         p1, p2 = player_order
 
-        # Assign reroll limits: first gets 3, second gets 2
-        rerolls = {p1: 3, p2: 2}
+        # Assign reroll limits: first gets 3, second gets 2 by default
+        rerolls = dict(zip(player_order, collection["rerolls"]))
 
         # Play turns
         if use_ai:
@@ -134,7 +133,8 @@ def play_game():
             if p1 == "Player 1":
                 rolls_1, sum_1, log_1 = play_turn_manual(p1, dice_types, rerolls[p1])
                 print_rolls_with_types(rolls_1, dice_types)
-                rolls_2, sum_2, log_2 = ai_player.play_turn(p2, dice_types, rerolls[p2])
+                # The AI moves second and already knows Player 1's final sum
+                rolls_2, sum_2, log_2 = ai_player.play_turn(p2, dice_types, rerolls[p2], opponent_sum=sum_1)
                 print(f"{p2} (AI) turn:")
                 for step in log_2:
                     if 'reroll_info' in step:
@@ -167,13 +167,14 @@ def play_game():
             target
         )
 
-        game_log["final_score"]["Player 1"] += p1_pts
-        game_log["final_score"]["Player 2"] += p2_pts
+        final_score["Player 1"] += p1_pts
+        final_score["Player 2"] += p2_pts
 
+        # p1 always played the first turn of the round
         round_data = {
             "round": round_num,
-            p1: {"log": log_1, "final_sum": sum_1 if p1 == "Player 1" else sum_2},
-            p2: {"log": log_2, "final_sum": sum_2 if p2 == "Player 2" else sum_1},
+            p1: {"log": log_1, "final_sum": sum_1},
+            p2: {"log": log_2, "final_sum": sum_2},
             "winner": f"Player {winner}" if winner else "Draw"
         }
 
@@ -181,15 +182,15 @@ def play_game():
         print(f"=> {p2} final sum: {round_data[p2]['final_sum']}")
         print(f"=> Round Winner: {'Draw' if winner == 0 else f'Player {winner}'}")
 
-        game_log["rounds"].append(round_data)
+        log_sink.write_round(round_data)
 
         # Alternate order
         player_order.reverse()
 
     # Final results
     print("\n=== FINAL SCORES ===")
-    p1_score = game_log["final_score"]["Player 1"]
-    p2_score = game_log["final_score"]["Player 2"]
+    p1_score = final_score["Player 1"]
+    p2_score = final_score["Player 2"]
     print(f"Player 1: {p1_score} points")
     print(f"Player 2: {p2_score} points")
     if p1_score > p2_score:
@@ -199,10 +200,16 @@ def play_game():
     else:
         print("🤝 The game is a draw!")
 
-    # Save log
-    with open("battle_dice_pvp_log.json", "w") as f:
-        json.dump(game_log, f, indent=2)
-    print("Game log saved to 'battle_dice_pvp_log.json'.")
+    log_sink.end_game(final_score)
+    log_sink.close()
+    print(f"Game log saved to '{log_path}'.")
 
 if __name__ == "__main__":
-    play_game()
+    import argparse
+    parser = argparse.ArgumentParser(description="Battle Dice in the terminal.")
+    parser.add_argument("--log", default="battle_dice_pvp_log.jsonl", help="game log (.json, .jsonl or .bdl)")
+    parser.add_argument("--seed", type=int, default=None, help="replay the dice of a logged game's seed")
+    parser.add_argument("--no-response", action="store_true",
+                        help="the AI moving second plays its model without using Player 1's final sum")
+    args = parser.parse_args()
+    play_game(args.log, seed=args.seed, response=not args.no_response)
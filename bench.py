@@ -0,0 +1,258 @@
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import time
+import numpy as np
+
+# --- Benchmark suite ---
+#
+# Each benchmark returns a zero-argument callable doing one operation. Calls
+# are timed in batches; ops/sec comes from the total time and the latency
+# percentiles from the per-batch average op time. Benchmarks whose optional
+# dependencies are missing (torch, PyQt5, pymunk) are skipped.
+
+SEED = 1234
+BENCHMARKS = {}
+
+
+def benchmark(name):
+    def register(setup):
+        BENCHMARKS[name] = setup
+        return setup
+    return register
+
+
+def _seed():
+    import dice
+    dice.seed(SEED)
+    random.seed(SEED)
+    np.random.seed(SEED)
+    try:
+        import torch
+        torch.manual_seed(SEED)
+    except ImportError:
+        pass
+
+
+@benchmark("battle_dice.roll_dice")
+def bench_roll_dice():
+    from battle_dice import COLLECTIONS, roll_dice
+    dice_types = COLLECTIONS["A"]["dice"]
+    return lambda: roll_dice(dice_types)
+
+
+@benchmark("BattleDiceEnv.reset")
+def bench_env_reset():
+    from train_ai import BattleDiceEnv
+    env = BattleDiceEnv([4, 8, 12], 14)
+    return env.reset
+
+
+@benchmark("BattleDiceEnv.step")
+def bench_env_step():
+    from train_ai import BattleDiceEnv
+    env = BattleDiceEnv([4, 8, 12], 14)
+
+    def step():
+        _, _, done, _ = env.step(random.randrange(4))
+        if done:
+            env.reset()
+    return step
+
+
+@benchmark("BattleDiceAIPlayer.get_state")
+def bench_ai_get_state():
+    from ai_player import BattleDiceAIPlayer
+    player = BattleDiceAIPlayer([4, 8, 12], 14, "battle_dice_dqn_A.npz")
+    return lambda: player.get_state([2, 5, 7], 2)
+
+
+@benchmark("BattleDiceAIPlayer.play_turn")
+def bench_ai_play_turn():
+    from ai_player import BattleDiceAIPlayer
+    player = BattleDiceAIPlayer([4, 8, 12], 14, "battle_dice_dqn_A.npz")
+    return lambda: player.play_turn("Player 2", [4, 8, 12], 3)
+
+
+@benchmark("BattleDiceAIPlayer.play_turns(1024)")
+def bench_ai_play_turns():
+    from ai_player import BattleDiceAIPlayer
+    player = BattleDiceAIPlayer([4, 8, 12], 14, "battle_dice_dqn_A.npz")
+    return lambda: player.play_turns(1024, 3)
+
+
+@benchmark("ReplayBuffer.push")
+def bench_buffer_push():
+    from train_ai import ReplayBuffer
+    memory = ReplayBuffer()
+    state = np.random.random(8).astype(np.float32)
+    return lambda: memory.push(state, 1, 0.0, state, False)
+
+
+@benchmark("ReplayBuffer.sample")
+def bench_buffer_sample():
+    from train_ai import ReplayBuffer
+    memory = ReplayBuffer()
+    states = np.random.random((10000, 8)).astype(np.float32)
+    memory.push_batch(states, np.random.randint(4, size=10000), np.random.random(10000),
+                      states, np.random.random(10000) < 0.3)
+    return lambda: memory.sample(64)
+
+
+@benchmark("PrioritizedReplayBuffer.sample")
+def bench_prioritized_sample():
+    from train_ai import PrioritizedReplayBuffer
+    memory = PrioritizedReplayBuffer()
+    states = np.random.random((10000, 8)).astype(np.float32)
+    memory.push_batch(states, np.random.randint(4, size=10000), np.random.random(10000),
+                      states, np.random.random(10000) < 0.3)
+    memory.update_priorities(np.arange(10000), np.random.random(10000))
+
+    def sample_and_update():
+        _, idx, _ = memory.sample_prioritized(64)
+        memory.update_priorities(idx, np.random.random(64))
+    return sample_and_update
+
+
+@benchmark("train_dqn.optimize_model")
+def bench_optimize_model():
+    import torch.optim as optim
+    from train_ai import DQN, ReplayBuffer, optimize_model
+    policy_net, target_net = DQN(), DQN()
+    target_net.load_state_dict(policy_net.state_dict())
+    optimizer = optim.Adam(policy_net.parameters(), lr=1e-3)
+    memory = ReplayBuffer()
+    states = np.random.random((10000, 8)).astype(np.float32)
+    memory.push_batch(states, np.random.randint(4, size=10000), np.random.random(10000),
+                      states, np.random.random(10000) < 0.3)
+    return lambda: optimize_model(policy_net, target_net, optimizer, memory, 64, 0.99)
+
+
+@benchmark("BattleDiceGUI.update_physics")
+def bench_update_physics():
+    # Headless: Qt renders offscreen
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PyQt5.QtWidgets import QApplication
+    from interface import BattleDiceGUI
+    app = QApplication.instance() or QApplication(sys.argv)
+    # Live stepping, so each call is one real physics frame
+    gui = BattleDiceGUI(fast_forward=False)
+    gui.roll_dice()
+    gui.timer.stop()
+    # The window and app must outlive the benchmark
+    bench_update_physics.keep_alive = (app, gui)
+    return gui.update_physics
+
+
+def run_benchmark(fn, min_time=0.5, batch_time=0.01, warmup=0.05, latency_samples=2000):
+    # Calibrate a batch size taking about batch_time, then time batches for min_time;
+    # latency percentiles come from up to latency_samples individually timed calls
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        elapsed = time.perf_counter() - start
+        if elapsed >= batch_time or number >= 1 << 20:
+            break
+        number *= 2
+    end = time.perf_counter() + warmup
+    while time.perf_counter() < end:
+        fn()
+
+    batches = 0
+    total_ops = 0
+    total_time = 0.0
+    while total_time < min_time or batches < 5:
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        elapsed = time.perf_counter() - start
+        batches += 1
+        total_ops += number
+        total_time += elapsed
+
+    # Per-call timings keep the tail that batch means average away; they include
+    # the timer's own overhead of well under a microsecond
+    op_times = []
+    end = time.perf_counter() + min_time / 2
+    while len(op_times) < latency_samples and (len(op_times) < 100 or time.perf_counter() < end):
+        start = time.perf_counter_ns()
+        fn()
+        op_times.append(time.perf_counter_ns() - start)
+    p50, p90, p99 = np.percentile(op_times, [50, 90, 99]) / 1e3
+    return {
+        "ops_per_sec": total_ops / total_time,
+        "ops": total_ops,
+        "batch_size": number,
+        "latency_us": {"p50": p50, "p90": p90, "p99": p99, "min": min(op_times) / 1e3,
+                       "samples": len(op_times)},
+    }
+
+
+def run_suite(names=None, min_time=0.5):
+    results = {}
+    for name, setup in BENCHMARKS.items():
+        if names and not any(n in name for n in names):
+            continue
+        _seed()
+        try:
+            fn = setup()
+        except ImportError as e:
+            results[name] = {"skipped": f"missing dependency: {e.name}"}
+            continue
+        results[name] = run_benchmark(fn, min_time=min_time)
+    return {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "seed": SEED,
+        "benchmarks": results,
+    }
+
+
+def compare(results, baseline, threshold=0.1):
+    # Benchmarks whose ops/sec fell more than threshold below the baseline
+    regressions = []
+    for name, result in results["benchmarks"].items():
+        base = baseline["benchmarks"].get(name)
+        if not base or "ops_per_sec" not in base or "ops_per_sec" not in result:
+            continue
+        ratio = result["ops_per_sec"] / base["ops_per_sec"]
+        if ratio < 1 - threshold:
+            regressions.append((name, ratio))
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Battle Dice benchmark suite.")
+    parser.add_argument("names", nargs="*", help="only run benchmarks whose name contains one of these")
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--baseline", help="results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.1, help="allowed ops/sec drop (default 10%%)")
+    parser.add_argument("--min-time", type=float, default=0.5, help="seconds per benchmark")
+    args = parser.parse_args()
+
+    results = run_suite(args.names, min_time=args.min_time)
+    print(f"{'benchmark':<32} {'ops/sec':>12} {'p50 us':>10} {'p90 us':>10} {'p99 us':>10}")
+    for name, result in results["benchmarks"].items():
+        if "skipped" in result:
+            print(f"{name:<32} skipped ({result['skipped']})")
+            continue
+        latency = result["latency_us"]
+        print(f"{name:<32} {result['ops_per_sec']:>12.0f} {latency['p50']:>10.2f} "
+              f"{latency['p90']:>10.2f} {latency['p99']:>10.2f}")
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results saved to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        for name, ratio in regressions:
+            print(f"REGRESSION {name}: {ratio:.2%} of baseline ops/sec")
+        if regressions:
+            sys.exit(1)
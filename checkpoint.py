@@ -0,0 +1,102 @@
+import copy
+import os
+import queue
+import re
+import threading
+import torch
+
+# --- Training checkpoints ---
+#
+# A checkpoint is the full train_dqn state: both networks, the optimizer, the
+# replay buffer, the environment's dice stream, epsilon, step and episode
+# counters and the global RNG states, so a resumed run continues exactly where
+# the saved one stopped. The training loop only takes an in-memory snapshot;
+# serialization and disk writes happen on a background thread.
+
+CHECKPOINT_PATTERN = re.compile(r"^ckpt_(\d+)\.pt$")
+
+
+def snapshot_module(module):
+    # CPU copy of a module's weights that later optimizer steps cannot touch
+    return {name: tensor.detach().cpu().clone() for name, tensor in module.state_dict().items()}
+
+
+def snapshot_optimizer(optimizer):
+    return copy.deepcopy(optimizer.state_dict())
+
+
+def checkpoint_paths(directory):
+    # Checkpoint files in directory, oldest first
+    if not os.path.isdir(directory):
+        return []
+    found = [(int(m.group(1)), name) for name in os.listdir(directory) if (m := CHECKPOINT_PATTERN.match(name))]
+    return [os.path.join(directory, name) for _, name in sorted(found)]
+
+
+def latest_checkpoint(directory):
+    paths = checkpoint_paths(directory)
+    return paths[-1] if paths else None
+
+
+def load_checkpoint(path, map_location="cpu"):
+    # Checkpoints hold NumPy arrays and RNG states next to tensors
+    return torch.load(path, map_location=map_location, weights_only=False)
+
+
+class AsyncCheckpointer:
+    """
+    Writes checkpoints from a background thread and keeps the newest `keep`.
+    save() never waits for the disk: when the writer is still busy, a pending
+    snapshot that has not been started yet is replaced by the newer one.
+    """
+    def __init__(self, directory, keep=3):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.keep = keep
+        self.written = []
+        self.error = None
+        self._pending = queue.Queue(maxsize=1)
+        self._thread = threading.Thread(target=self._run, name="checkpoint-writer", daemon=True)
+        self._thread.start()
+
+    def save(self, episode, state):
+        while True:
+            try:
+                self._pending.put_nowait((episode, state))
+                return
+            except queue.Full:
+                try:
+                    self._pending.get_nowait()
+                except queue.Empty:
+                    pass
+
+    def _run(self):
+        while True:
+            item = self._pending.get()
+            if item is None:
+                return
+            episode, state = item
+            try:
+                self._write(episode, state)
+            except Exception as e:
+                # Reported from close(), training itself keeps going
+                self.error = e
+
+    def _write(self, episode, state):
+        path = os.path.join(self.directory, f"ckpt_{episode:09d}.pt")
+        tmp_path = path + ".tmp"
+        torch.save(state, tmp_path)
+        os.replace(tmp_path, path)
+        self.written.append(path)
+        for old_path in checkpoint_paths(self.directory)[:-self.keep]:
+            os.remove(old_path)
+
+    def close(self, raise_error=True):
+        # Flush the pending snapshot and stop the writer; a failed write is
+        # raised, or only reported when the caller is already handling an error
+        self._pending.put(None)
+        self._thread.join()
+        if self.error is not None:
+            if raise_error:
+                raise self.error
+            print(f"Checkpoint writer failed: {self.error!r}")
@@ -0,0 +1,75 @@
+import os
+import numpy as np
+
+# --- Shared dice source ---
+#
+# Rolls are generated in NumPy blocks per die size and served from a list, so
+# a roll costs a list pop instead of a random.randint call. Sources are
+# seedable, and substream(key) derives independent, reproducible child
+# streams (per game, per worker, ...) from the same seed.
+
+
+class DiceSource:
+    def __init__(self, seed=None, block_size=4096):
+        self.block_size = block_size
+        self.reseed(seed)
+
+    def reseed(self, seed=None):
+        if isinstance(seed, np.random.SeedSequence):
+            self.seed_sequence = seed
+        else:
+            self.seed_sequence = np.random.SeedSequence(seed)
+        self.rng = np.random.default_rng(self.seed_sequence)
+        self._blocks = {}
+
+    def roll(self, sides):
+        block = self._blocks.get(sides)
+        if not block:
+            block = self.rng.integers(1, sides + 1, size=self.block_size).tolist()
+            self._blocks[sides] = block
+        return block.pop()
+
+    def roll_dice(self, dice_types):
+        return [self.roll(d) for d in dice_types]
+
+    def state_dict(self):
+        # Everything needed to continue the exact same stream, e.g. in a checkpoint
+        return {"seed_sequence": self.seed_sequence, "rng": self.rng.bit_generator.state,
+                "blocks": {sides: list(block) for sides, block in self._blocks.items()}}
+
+    def load_state_dict(self, state):
+        self.seed_sequence = state["seed_sequence"]
+        self.rng = np.random.default_rng(self.seed_sequence)
+        self.rng.bit_generator.state = state["rng"]
+        self._blocks = {sides: list(block) for sides, block in state["blocks"].items()}
+
+    def substream(self, *key):
+        seq = self.seed_sequence
+        return DiceSource(np.random.SeedSequence(seq.entropy, spawn_key=seq.spawn_key + tuple(key)),
+                          self.block_size)
+
+
+# Process-wide source used by default everywhere
+_default = DiceSource()
+
+
+def default_source():
+    return _default
+
+
+def seed(value=None):
+    # Reseed in place so modules holding the default source see the new stream
+    _default.reseed(value)
+
+
+def roll_die(sides):
+    return _default.roll(sides)
+
+
+def roll_dice(dice_types):
+    return _default.roll_dice(dice_types)
+
+
+# Forked workers must not replay the parent's buffered rolls
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=seed)
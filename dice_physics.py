@@ -0,0 +1,107 @@
+import random
+import pymunk
+
+# --- Dice physics ---
+#
+# A fixed pool of die bodies lives in one pymunk space for the whole session:
+# throws reposition and re-launch the existing bodies instead of adding new
+# ones, and settled dice fall asleep so pymunk stops simulating them.
+# simulate() runs a throw to rest in one burst and returns the frames, so the
+# GUI can replay them at display rate without stepping physics per frame.
+
+WIDTH = 800
+HEIGHT = 400
+DIE_SIZE = 60
+FLOOR_Y = 390
+DT = 1 / 60.0
+
+
+class DicePhysics:
+    def __init__(self, count, dt=DT, max_frames=1200):
+        self.dt = dt
+        self.max_frames = max_frames
+        self.space = pymunk.Space()
+        self.space.gravity = (0.0, 900.0)
+        # Bodies idle below this speed for this long are put to sleep
+        self.space.idle_speed_threshold = 5.0
+        self.space.sleep_time_threshold = 0.3
+        self._add_walls()
+        self.bodies = []
+        for i in range(count):
+            body = pymunk.Body(1, pymunk.moment_for_box(1, (DIE_SIZE, DIE_SIZE)))
+            body.position = self.home_position(i)
+            shape = pymunk.Poly.create_box(body, (DIE_SIZE, DIE_SIZE))
+            shape.friction = 0.9
+            shape.elasticity = 0.5  # More realistic bounce
+            shape.collision_type = 1
+            shape.filter = pymunk.ShapeFilter(group=1)
+            self.space.add(body, shape)
+            self.bodies.append(body)
+
+    def _add_walls(self):
+        walls = [
+            ((0, FLOOR_Y), (WIDTH, FLOOR_Y), 0.6),   # floor, bouncy
+            ((0, 0), (0, HEIGHT), 0.6),              # left wall
+            ((WIDTH, 0), (WIDTH, HEIGHT), 0.6),      # right wall
+            ((0, 0), (WIDTH, 0), 0.5),               # top wall keeps dice on screen
+        ]
+        for a, b, elasticity in walls:
+            wall = pymunk.Segment(self.space.static_body, a, b, 5)
+            wall.friction = 0.8
+            wall.elasticity = elasticity
+            self.space.add(wall)
+
+    def home_position(self, i):
+        return (100 + i * 200, 170)
+
+    def throw(self, indices=None, spin=False):
+        # Re-launch pooled dice from the top with a random impulse
+        indices = range(len(self.bodies)) if indices is None else indices
+        for i in indices:
+            body = self.bodies[i]
+            body.position = (150 + i * 200 + random.randint(-20, 20), 50)
+            body.velocity = (0, 0)
+            body.angle = random.uniform(0, 3.14)
+            body.angular_velocity = random.uniform(-5, 5) if spin else 0
+            body.activate()
+            body.apply_impulse_at_local_point((random.uniform(-120, 120), random.uniform(350, 500)))
+
+    def step(self):
+        self.space.step(self.dt)
+        for body in self.bodies:
+            if body.is_sleeping:
+                continue
+            # Clamp dice to stay within the screen horizontally
+            if body.position.x < 30:
+                body.position = (30, body.position.y)
+                body.velocity = (abs(body.velocity.x), body.velocity.y)
+            elif body.position.x > WIDTH - 30:
+                body.position = (WIDTH - 30, body.position.y)
+                body.velocity = (-abs(body.velocity.x), body.velocity.y)
+            # Clamp dice to stay within the screen vertically
+            if body.position.y < 30:
+                body.position = (body.position.x, 30)
+                body.velocity = (body.velocity.x, abs(body.velocity.y))
+
+    def settled(self):
+        # Stop once every die is asleep, or resting on the ground (not a wall) and slow
+        def at_rest(body):
+            if body.is_sleeping:
+                return True
+            on_ground = body.position.y > FLOOR_Y - 20 and 30 < body.position.x < WIDTH - 30
+            return on_ground and abs(body.velocity.y) < 5 and abs(body.velocity.x) < 5
+        return all(at_rest(body) for body in self.bodies)
+
+    def poses(self):
+        return [(body.position.x, body.position.y, body.angle) for body in self.bodies]
+
+    def simulate(self, indices=None, spin=False):
+        # Throw and step to rest in one burst; returns one pose list per frame
+        self.throw(indices, spin)
+        frames = []
+        for _ in range(self.max_frames):
+            self.step()
+            frames.append(self.poses())
+            if self.settled():
+                break
+        return frames
@@ -0,0 +1,170 @@
+import queue
+import random
+import numpy as np
+import torch
+import torch.multiprocessing as mp
+import torch.optim as optim
+from dice import DiceSource
+from train_ai import BattleDiceEnv, DQN, ReplayBuffer, epsilon_by_step, optimize_model
+
+# --- Multi-process actor/learner training ---
+#
+# Actors each run their own BattleDiceEnv with an epsilon-greedy copy of the
+# DQN and send transitions to the learner in chunks through a queue. The
+# learner owns the replay buffer and optimizer, and publishes fresh weights
+# through a shared-memory DQN that actors copy whenever its version changes.
+# weights_lock covers both the publish and the copy, so an actor never loads a
+# half-written set of weights.
+
+
+def run_actor(rank, num_actors, dice_types, target, shared_net, weights_version, weights_lock,
+              transition_queue, stop_event, chunk_size, epsilon_start, epsilon_end,
+              epsilon_decay, seed, max_rerolls_first=3, max_rerolls_second=2):
+    torch.set_num_threads(1)
+    dice_source = None
+    if seed is not None:
+        random.seed(seed + rank)
+        np.random.seed(seed + rank)
+        torch.manual_seed(seed + rank)
+        dice_source = DiceSource(seed).substream(rank)
+
+    env = BattleDiceEnv(dice_types, target, max_rerolls_first, max_rerolls_second, dice_source=dice_source)
+    net = DQN(env.state_dim, env.num_actions)
+    with weights_lock:
+        net.load_state_dict(shared_net.state_dict())
+        local_version = weights_version.value
+    net.eval()
+
+    states, actions, rewards, next_states, dones = [], [], [], [], []
+    episodes = 0
+    steps_done = 0
+    state = env.reset()
+    while not stop_event.is_set():
+        if weights_version.value != local_version:
+            with weights_lock:
+                net.load_state_dict(shared_net.state_dict())
+                local_version = weights_version.value
+
+        # Epsilon follows the schedule of train_dqn on the approximate global step count
+        epsilon = epsilon_by_step(steps_done * num_actors, epsilon_start, epsilon_end, epsilon_decay)
+        steps_done += 1
+        if random.random() > epsilon:
+            with torch.no_grad():
+                action = net(torch.from_numpy(state)).argmax().item()
+        else:
+            action = random.randrange(env.num_actions)
+
+        next_state, reward, done, _ = env.step(action)
+        states.append(state)
+        actions.append(action)
+        rewards.append(reward)
+        next_states.append(next_state)
+        dones.append(done)
+        state = next_state
+        if done:
+            episodes += 1
+            state = env.reset()
+
+        if len(states) >= chunk_size:
+            transition_queue.put((np.stack(states), np.array(actions), np.array(rewards, dtype=np.float32),
+                                  np.stack(next_states), np.array(dones), episodes))
+            states, actions, rewards, next_states, dones = [], [], [], [], []
+            episodes = 0
+
+
+def train_dqn_distributed(dice_types, target, num_actors=4, num_episodes=10000, batch_size=64,
+                          gamma=0.99, lr=1e-3, epsilon_start=1.0, epsilon_end=0.1,
+                          epsilon_decay=5000, broadcast_every=50, chunk_size=64, seed=None,
+                          model_path="battle_dice_dqn.pth", max_rerolls_first=3, max_rerolls_second=2):
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    ctx = mp.get_context("spawn")
+    # Same network shape as BattleDiceEnv states and actions
+    state_dim, num_actions = 2 * len(dice_types) + 2, len(dice_types) + 1
+
+    policy_net = DQN(state_dim, num_actions).to(device)
+    target_net = DQN(state_dim, num_actions).to(device)
+    target_net.load_state_dict(policy_net.state_dict())
+    target_net.eval()
+    optimizer = optim.Adam(policy_net.parameters(), lr=lr)
+    memory = ReplayBuffer(state_dim=state_dim)
+
+    # Weights published to the actors
+    shared_net = DQN(state_dim, num_actions)
+    shared_net.load_state_dict(policy_net.state_dict())
+    shared_net.share_memory()
+    weights_version = ctx.Value('i', 0)
+    weights_lock = ctx.Lock()
+
+    transition_queue = ctx.Queue(maxsize=num_actors * 8)
+    stop_event = ctx.Event()
+    actors = [
+        ctx.Process(target=run_actor, daemon=True, args=(
+            rank, num_actors, dice_types, target, shared_net, weights_version, weights_lock, transition_queue,
+            stop_event, chunk_size, epsilon_start, epsilon_end, epsilon_decay, seed, max_rerolls_first,
+            max_rerolls_second))
+        for rank in range(num_actors)
+    ]
+    for actor in actors:
+        actor.start()
+
+    episode = 0
+    updates = 0
+    try:
+        while episode < num_episodes:
+            # Block only while the buffer is too small to train on
+            chunks = []
+            try:
+                chunks.append(transition_queue.get(timeout=None if len(memory) < batch_size else 0.001))
+                while True:
+                    chunks.append(transition_queue.get_nowait())
+            except queue.Empty:
+                pass
+
+            for states, actions, rewards, next_states, dones, finished in chunks:
+                memory.push_batch(states, actions, rewards, next_states, dones)
+                if finished and (episode + finished) // 500 > episode // 500:
+                    print(f"Episode {episode + finished} buffer: {len(memory)} updates: {updates}")
+                    # Update target network
+                    target_net.load_state_dict(policy_net.state_dict())
+                episode += finished
+
+            if len(memory) >= batch_size:
+                optimize_model(policy_net, target_net, optimizer, memory, batch_size, gamma, device)
+                updates += 1
+                if updates % broadcast_every == 0:
+                    with weights_lock:
+                        shared_net.load_state_dict(policy_net.state_dict())
+                        weights_version.value += 1
+    finally:
+        stop_event.set()
+        # Drain so actors blocked on a full queue can exit
+        try:
+            while True:
+                transition_queue.get_nowait()
+        except queue.Empty:
+            pass
+        for actor in actors:
+            actor.join(timeout=5)
+            if actor.is_alive():
+                actor.terminate()
+
+    # Save trained model in the same format as train_dqn
+    torch.save(policy_net.state_dict(), model_path)
+    print(f"Training complete, model saved as {model_path}")
+
+
+if __name__ == "__main__":
+    import os
+    from battle_dice import COLLECTIONS
+    from registry import ArtifactCache, ModelRegistry
+    cache = ArtifactCache()
+    models = ModelRegistry(cache)
+    for key, collection in COLLECTIONS.items():
+        print(f"\n=== Training DQN for Collection {key} with {os.cpu_count()} actors ===")
+        model_path = cache.path(collection, "dqn.pth")
+        rerolls_first, rerolls_second = collection["rerolls"]
+        train_dqn_distributed(collection["dice"], collection["target"], num_actors=os.cpu_count(),
+                              model_path=model_path, max_rerolls_first=rerolls_first,
+                              max_rerolls_second=rerolls_second)
+        version = models.publish(collection, model_path, tags=["latest"], trainer="train_dqn_distributed")
+        print(f"Model for Collection {key} published as v{version}")
@@ -0,0 +1,176 @@
+import queue
+import threading
+import numpy as np
+from ai_player import dqn_forward
+
+# --- Policy evaluation during training ---
+#
+# Weight snapshots are scored on a background thread by playing a large batch
+# of rounds greedily against the env's heuristic, under the env's rules. Every
+# evaluation draws its dice from a fresh env with the same seed: the initial
+# rolls of both players plus, per game and die, a tape of reroll results, the
+# k-th reroll of a die taking its k-th tape value. Two snapshots that reroll
+# the same die get the same result whatever they did before (common random
+# numbers), and the heuristic's turns are identical across evaluations, so
+# score differences reflect the policy rather than luck.
+
+
+def compile_env_policy(weights, env):
+    # Greedy action for every (rolls, rerolls_left) state in the env's own state encoding,
+    # covering both seats' reroll budgets
+    shape = tuple(env.dice_types) + (max(env.max_rerolls_first, env.max_rerolls_second) + 1,)
+    grid = np.indices(shape).reshape(len(shape), -1).T
+    states = env._get_states(grid[:, :-1] + 1, grid[:, -1])
+    policy = dqn_forward(weights, states).argmax(1).reshape(shape)
+    policy[..., 0] = len(env.dice_types)
+    return policy
+
+
+def play_table_turns(table, rolls, tape, rerolls):
+    # Final sums of turns played by a policy table; the k-th reroll of die i takes tape[:, i, k]
+    rolls = rolls.copy()
+    used = np.zeros_like(rolls)
+    n = rolls.shape[1]
+    active = np.ones(len(rolls), dtype=bool)
+    for rerolls_left in range(rerolls, 0, -1):
+        actions = table[tuple((rolls - 1).T) + (rerolls_left,)].astype(np.int64)
+        active &= actions != n
+        if not active.any():
+            break
+        sel = np.flatnonzero(active)
+        idx = actions[sel]
+        rolls[sel, idx] = tape[sel, idx, used[sel, idx]]
+        used[sel, idx] += 1
+    return rolls.sum(axis=1)
+
+
+def _play_seat(policy, heuristic, env, agent_rerolls, heuristic_rerolls):
+    # Rates for one round per game, the agent's turn played with agent_rerolls
+    sides = np.asarray(env.dice_types)
+    size, n = env.num_envs, len(sides)
+    agent_rolls = env.rng.integers(1, sides + 1, size=(size, n))
+    heuristic_rolls = env.rng.integers(1, sides + 1, size=(size, n))
+    agent_tape = env.rng.integers(1, sides[:, None] + 1, size=(size, n, max(agent_rerolls, 1)))
+    heuristic_tape = env.rng.integers(1, sides[:, None] + 1, size=(size, n, max(heuristic_rerolls, 1)))
+
+    agent_sums = play_table_turns(policy, agent_rolls, agent_tape, agent_rerolls)
+    heuristic_sums = play_table_turns(heuristic, heuristic_rolls, heuristic_tape, heuristic_rerolls)
+    s_agent = np.where(agent_sums <= env.target, agent_sums, -1)
+    s_heuristic = np.where(heuristic_sums <= env.target, heuristic_sums, -1)
+    win, draw = float((s_agent > s_heuristic).mean()), float((s_agent == s_heuristic).mean())
+    return {"win_rate": win, "draw_rate": draw, "loss_rate": 1.0 - win - draw, "score": win + 0.5 * draw}
+
+
+def evaluate_vs_heuristic(weights, env, both_seats=False):
+    """
+    Play one round in each of env's games with the greedy policy of weights
+    moving first against the heuristic, on dice tapes drawn from env.rng.
+    With both_seats, a second batch has the heuristic move first and the
+    agent reply with the second mover's budget, and the rates are the mean
+    of the two seats (first_score and second_score keep them apart).
+    Returns win, draw and loss rates and score = win + draw / 2.
+    """
+    from train_ai import heuristic_table
+    policy = compile_env_policy(weights, env)
+    rerolls_first, rerolls_second = env.max_rerolls_first, env.max_rerolls_second
+    heuristic = heuristic_table(env.dice_types, env.target, max(rerolls_first, rerolls_second))
+    first = _play_seat(policy, heuristic, env, rerolls_first, rerolls_second)
+    if not both_seats:
+        return first
+    second = _play_seat(policy, heuristic, env, rerolls_second, rerolls_first)
+    result = {name: (first[name] + second[name]) / 2 for name in first}
+    result.update(first_score=first["score"], second_score=second["score"])
+    return result
+
+
+class BackgroundEvaluator:
+    """
+    Scores weight snapshots with evaluate_vs_heuristic on a worker thread.
+    make_env() builds the (seeded) evaluation env; both_seats scores the
+    agent moving second as well. The best snapshot is saved
+    to best_path as .npz; should_stop turns on after `patience` evaluations
+    without an improvement of more than min_delta. Like the checkpointer, a
+    snapshot still waiting when a newer one arrives is replaced.
+    """
+    def __init__(self, make_env, best_path=None, patience=None, min_delta=0.0, both_seats=False):
+        self.make_env = make_env
+        self.both_seats = both_seats
+        self.best_path = best_path
+        self.patience = patience
+        self.min_delta = min_delta
+        self.history = []
+        self.best = None
+        self.evals_since_best = 0
+        self.should_stop = False
+        self.error = None
+        self._reported = 0
+        self._lock = threading.Lock()
+        self._pending = queue.Queue(maxsize=1)
+        self._thread = threading.Thread(target=self._run, name="policy-evaluator", daemon=True)
+        self._thread.start()
+
+    def submit(self, episode, weights):
+        while True:
+            try:
+                self._pending.put_nowait((episode, weights))
+                return
+            except queue.Full:
+                try:
+                    self._pending.get_nowait()
+                except queue.Empty:
+                    pass
+
+    def _run(self):
+        while True:
+            item = self._pending.get()
+            if item is None:
+                return
+            episode, weights = item
+            try:
+                result = dict(evaluate_vs_heuristic(weights, self.make_env(), self.both_seats), episode=episode)
+                self._record(result, weights)
+            except Exception as e:
+                self.error = e
+
+    def _record(self, result, weights):
+        improved = self.best is None or result["score"] > self.best["score"] + self.min_delta
+        if improved and self.best_path is not None:
+            np.savez(self.best_path, **weights)
+        with self._lock:
+            self.history.append(result)
+            if improved:
+                self.best = result
+                self.evals_since_best = 0
+            else:
+                self.evals_since_best += 1
+                if self.patience is not None and self.evals_since_best >= self.patience:
+                    self.should_stop = True
+
+    def poll(self):
+        # Results finished since the last poll
+        with self._lock:
+            new = self.history[self._reported:]
+            self._reported = len(self.history)
+        return new
+
+    def state_dict(self):
+        with self._lock:
+            return {"history": list(self.history), "best": self.best, "evals_since_best": self.evals_since_best}
+
+    def load_state_dict(self, state):
+        with self._lock:
+            self.history = list(state["history"])
+            self._reported = len(self.history)
+            self.best = state["best"]
+            self.evals_since_best = state["evals_since_best"]
+            self.should_stop = self.patience is not None and self.evals_since_best >= self.patience
+
+    def close(self, raise_error=True):
+        # Finish the pending evaluation and stop the worker; like AsyncCheckpointer.close,
+        # a failure is only reported when the caller is already handling an error
+        self._pending.put(None)
+        self._thread.join()
+        if self.error is not None:
+            if raise_error:
+                raise self.error
+            print(f"Policy evaluator failed: {self.error!r}")
@@ -0,0 +1,321 @@
+import itertools
+import json
+import os
+import struct
+import uuid
+
+# --- Game log sinks and readers ---
+#
+# Three on-disk formats share the legacy battle_dice_pvp_log.json schema:
+#   .json   one pretty-printed game (legacy, written at the end of a game)
+#   .jsonl  one line per round, appended and flushed as each round completes
+#   .bdl    fixed-width binary records, one per round, for bulk simulation
+# Readers yield games in the legacy schema whatever the source format.
+
+BINARY_MAGIC = b"BDLG"
+BINARY_VERSION = 2
+BINARY_PREFIX = struct.Struct("<4sB")  # magic, version
+# Header json length after the prefix: u8 in version 1 files, u32 since version 2
+BINARY_LENGTH = {1: struct.Struct("<B"), 2: struct.Struct("<I")}
+# Rolls and the rerolls' old/new values are stored as u8
+MAX_BINARY_SIDES = 255
+
+
+class JsonlLogSink:
+    """
+    Appends each round as a JSON line. Steps drop the repeated "dice" and
+    "sum" fields, which readers restore from the game line. Sinks may share
+    an open file; concurrent games then interleave, keyed by game id.
+    """
+    def __init__(self, path, file=None):
+        self.path = path
+        self.owns_file = file is None
+        self.file = open(path, "a") if file is None else file
+        self.game_id = None
+
+    def start_game(self, collection_key, dice_types, target, seed=None):
+        self.game_id = uuid.uuid4().hex[:12]
+        record = {"game": self.game_id, "collection": collection_key, "dice": dice_types, "target": target}
+        if seed is not None:
+            record["seed"] = seed
+        self._write(record)
+
+    def write_round(self, round_data):
+        record = {"game": self.game_id}
+        for key, value in round_data.items():
+            if isinstance(value, dict):
+                value = {"log": [_compact_step(step) for step in value["log"]], "final_sum": value["final_sum"]}
+            record[key] = value
+        self._write(record)
+
+    def end_game(self, final_score):
+        self._write({"game": self.game_id, "final_score": final_score})
+
+    def _write(self, record):
+        self.file.write(json.dumps(record, separators=(",", ":")) + "\n")
+        self.file.flush()
+
+    def close(self):
+        if self.owns_file:
+            self.file.close()
+
+
+class BinaryLogSink:
+    """
+    Fixed-width records for one collection per file. The header stores the
+    collection; each record holds one round:
+    game u32, round u8, first player u8, winner u8, then for each seat in
+    turn order the initial rolls, the reroll budget, the rerolls used,
+    max_rerolls (index, old, new) slots and the final sum.
+    """
+    def __init__(self, path, max_rerolls=3):
+        self.path = path
+        self.max_rerolls = max_rerolls
+        self.file = open(path, "ab")
+        self.header = None
+        self.record = None
+        self.game_id = -1
+        if self.file.tell() > 0:
+            # Appending: check the layout and continue the game numbering
+            with open(path, "rb") as f:
+                self.header = _read_binary_header(f)
+                self.record = _record_struct(self.header)
+                start = f.tell()
+                end = os.path.getsize(path)
+                if end - start >= self.record.size:
+                    f.seek(end - (end - start) % self.record.size - self.record.size)
+                    self.game_id = self.record.unpack(f.read(self.record.size))[0]
+
+    def start_game(self, collection_key, dice_types, target, seed=None):
+        # The header is shared by every game in the file, so per-game seeds are not stored
+        header = {"collection": collection_key, "dice": list(dice_types), "target": target,
+                  "max_rerolls": self.max_rerolls}
+        if max(dice_types) > MAX_BINARY_SIDES:
+            raise ValueError(f"Binary logs store rolls as bytes; dice {list(dice_types)} have more than "
+                             f"{MAX_BINARY_SIDES} sides")
+        if self.header is None:
+            payload = json.dumps(header).encode()
+            self.file.write(BINARY_PREFIX.pack(BINARY_MAGIC, BINARY_VERSION) +
+                            BINARY_LENGTH[BINARY_VERSION].pack(len(payload)) + payload)
+            self.header = header
+            self.record = _record_struct(header)
+        elif self.header != header:
+            raise ValueError(f"{self.path} holds collection {self.header}, not {header}")
+        self.game_id += 1
+
+    def write_round(self, round_data):
+        seats = [key for key, value in round_data.items() if isinstance(value, dict)]
+        winner = round_data["winner"]
+        values = [self.game_id, round_data["round"], int(seats[0].split()[-1]),
+                  0 if winner == "Draw" else int(winner.split()[-1])]
+        for seat in seats:
+            log = round_data[seat]["log"]
+            rerolls = [step["reroll_info"] for step in log[1:]]
+            if len(rerolls) > self.max_rerolls:
+                raise ValueError(f"Binary log {self.path} has {self.max_rerolls} reroll slots per turn; "
+                                 f"{seat} rerolled {len(rerolls)} times")
+            values.extend(log[0]["roll"])
+            values.append(log[0]["rerolls_left"])
+            values.append(len(rerolls))
+            for i in range(self.max_rerolls):
+                info = rerolls[i] if i < len(rerolls) else {"index": 0, "old": 0, "new": 0}
+                values.extend((info["index"], info["old"], info["new"]))
+            values.append(round_data[seat]["final_sum"])
+        self.file.write(self.record.pack(*values))
+
+    def end_game(self, final_score):
+        # Scores are recomputed from the round winners on read
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class JsonLogSink:
+    # Legacy format: the whole game pretty-printed once it is over
+    def __init__(self, path):
+        self.path = path
+        self.game_log = None
+
+    def start_game(self, collection_key, dice_types, target, seed=None):
+        self.game_log = {"collection": collection_key, "rounds": [], "final_score": {}}
+        if seed is not None:
+            self.game_log["seed"] = seed
+
+    def write_round(self, round_data):
+        self.game_log["rounds"].append(round_data)
+
+    def end_game(self, final_score):
+        self.game_log["final_score"] = final_score
+        with open(self.path, "w") as f:
+            json.dump(self.game_log, f, indent=2)
+
+    def close(self):
+        pass
+
+
+def open_log_sink(path, **kwargs):
+    # Pick the sink from the file extension; kwargs only reach the binary sink
+    if path.endswith(".jsonl"):
+        return JsonlLogSink(path)
+    if path.endswith(".bdl"):
+        return BinaryLogSink(path, **kwargs)
+    return JsonLogSink(path)
+
+
+def _compact_step(step):
+    return {key: value for key, value in step.items() if key not in ("dice", "sum")}
+
+
+def _full_step(step, dice_types):
+    full = {"roll": step["roll"], "dice": dice_types, "sum": sum(step["roll"]), "rerolls_left": step["rerolls_left"]}
+    if "reroll_info" in step:
+        full["reroll_info"] = step["reroll_info"]
+    return full
+
+
+def _read_binary_header(f):
+    magic, version = BINARY_PREFIX.unpack(f.read(BINARY_PREFIX.size))
+    if magic != BINARY_MAGIC or version not in BINARY_LENGTH:
+        raise ValueError(f"{f.name} is not a version 1-{BINARY_VERSION} binary game log")
+    length_struct = BINARY_LENGTH[version]
+    length, = length_struct.unpack(f.read(length_struct.size))
+    return json.loads(f.read(length))
+
+
+def _record_struct(header):
+    n = len(header["dice"])
+    seat = f"{n}BBB{3 * header['max_rerolls']}BH"
+    return struct.Struct(f"<IBBB{seat}{seat}")
+
+
+def _score_game(rounds):
+    final_score = {"Player 1": 0, "Player 2": 0}
+    for round_data in rounds:
+        winner = round_data["winner"]
+        if winner == "Draw":
+            final_score["Player 1"] += 1
+            final_score["Player 2"] += 1
+        else:
+            final_score[winner] += 2
+    return final_score
+
+
+def _read_json(path):
+    with open(path) as f:
+        yield json.load(f)
+
+
+def _read_jsonl(path):
+    games = {}
+    with open(path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            game_id = record.pop("game")
+            if "collection" in record:
+                games[game_id] = {"collection": record["collection"], "dice": record["dice"],
+                                  "rounds": [], "final_score": None}
+                if "seed" in record:
+                    games[game_id]["seed"] = record["seed"]
+            elif "final_score" in record:
+                game = games.pop(game_id)
+                game["final_score"] = record["final_score"]
+                dice_types = game.pop("dice")
+                yield _inflate(game, dice_types)
+            else:
+                games[game_id]["rounds"].append(record)
+    # Games cut short by a crash still yield their completed rounds
+    for game in games.values():
+        dice_types = game.pop("dice")
+        game["final_score"] = _score_game(game["rounds"])
+        yield _inflate(game, dice_types)
+
+
+def _inflate(game, dice_types):
+    for round_data in game["rounds"]:
+        for key, value in round_data.items():
+            if isinstance(value, dict):
+                value["log"] = [_full_step(step, dice_types) for step in value["log"]]
+    return game
+
+
+def _read_binary(path, chunk_records=4096):
+    with open(path, "rb") as f:
+        header = _read_binary_header(f)
+        record = _record_struct(header)
+        dice_types = header["dice"]
+        n = len(dice_types)
+        max_rerolls = header["max_rerolls"]
+        seat_width = n + 3 + 3 * max_rerolls
+        game_id, rounds = None, []
+        while True:
+            chunk = f.read(record.size * chunk_records)
+            if not chunk:
+                break
+            for values in record.iter_unpack(chunk[:len(chunk) - len(chunk) % record.size]):
+                if values[0] != game_id and rounds:
+                    yield {"collection": header["collection"], "rounds": rounds, "final_score": _score_game(rounds)}
+                    rounds = []
+                game_id = values[0]
+                first = values[2]
+                winner = values[3]
+                round_data = {"round": values[1]}
+                for seat_num, player in enumerate((first, 3 - first)):
+                    seat = values[4 + seat_num * seat_width:4 + (seat_num + 1) * seat_width]
+                    rolls = list(seat[:n])
+                    rerolls_left = seat[n]
+                    log = [{"roll": rolls[:], "dice": dice_types, "sum": sum(rolls), "rerolls_left": rerolls_left}]
+                    for i in range(seat[n + 1]):
+                        index, old, new = seat[n + 2 + 3 * i:n + 5 + 3 * i]
+                        rolls[index] = new
+                        rerolls_left -= 1
+                        log.append({"roll": rolls[:], "dice": dice_types, "sum": sum(rolls),
+                                    "rerolls_left": rerolls_left,
+                                    "reroll_info": {"index": index, "old": old, "new": new}})
+                    round_data[f"Player {player}"] = {"log": log, "final_sum": seat[-1]}
+                round_data["winner"] = f"Player {winner}" if winner else "Draw"
+                rounds.append(round_data)
+        if rounds:
+            yield {"collection": header["collection"], "rounds": rounds, "final_score": _score_game(rounds)}
+
+
+def read_game_log(path):
+    """
+    Lazily iterate the games in a .json, .jsonl or .bdl log, each in the
+    legacy battle_dice_pvp_log.json schema.
+    """
+    if path.endswith(".jsonl"):
+        return _read_jsonl(path)
+    if path.endswith(".bdl"):
+        return _read_binary(path)
+    return _read_json(path)
+
+
+def convert_log(src_path, dst_path):
+    # Copy every game from one log format to another
+    from battle_dice import COLLECTIONS
+    if os.path.abspath(src_path) == os.path.abspath(dst_path):
+        raise ValueError("Cannot convert a log onto itself")
+    games = iter(read_game_log(src_path))
+    first = next(games, None)
+    if first is None:
+        return
+    sink = open_log_sink(dst_path, max_rerolls=max(COLLECTIONS[first["collection"]]["rerolls"]))
+    try:
+        for game in itertools.chain([first], games):
+            collection = COLLECTIONS[game["collection"]]
+            sink.start_game(game["collection"], collection["dice"], collection["target"])
+            for round_data in game["rounds"]:
+                sink.write_round(round_data)
+            sink.end_game(game["final_score"])
+    finally:
+        sink.close()
+
+
+if __name__ == "__main__":
+    # python game_log.py battle_dice_pvp_log.json battle_dice_pvp_log.jsonl
+    import sys
+    convert_log(sys.argv[1], sys.argv[2])
+    print(f"Converted {sys.argv[1]} to {sys.argv[2]}")
@@ -1,17 +1,43 @@
 import sys
-import random
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QWidget, QPushButton, QLabel, QVBoxLayout, QHBoxLayout, QGraphicsView, QGraphicsScene, QGraphicsPolygonItem, QMessageBox
 )
-from PyQt5.QtCore import Qt, QTimer, QPointF
+from PyQt5.QtCore import Qt, QTimer, QPointF, QObject, QRunnable, QThreadPool, pyqtSignal
 from PyQt5.QtGui import QPixmap, QFont, QPainter, QPen, QBrush, QColor, QPolygonF
-import pymunk
-import pymunk.pygame_util
 import os
+from dice import roll_die, default_source
+from dice_physics import DicePhysics
+from battle_dice import COLLECTIONS, determine_round_winner
+from game_log import open_log_sink
+from registry import load_ai_player
+
+
+class WorkerSignals(QObject):
+    finished = pyqtSignal(object)
+    failed = pyqtSignal(str)
+
+
+class Worker(QRunnable):
+    # Runs fn(*args) on a QThreadPool thread and reports back through signals
+    def __init__(self, fn, *args):
+        super().__init__()
+        self.fn = fn
+        self.args = args
+        self.signals = WorkerSignals()
+
+    def run(self):
+        try:
+            result = self.fn(*self.args)
+        except Exception as e:
+            self.signals.failed.emit(f"{type(e).__name__}: {e}")
+        else:
+            self.signals.finished.emit(result)
+
 
 class BattleDiceGUI(QMainWindow):
-    def __init__(self, dice_types=[4, 8, 12], target=14, parent=None):
+    def __init__(self, dice_types=[4, 8, 12], target=14, parent=None, fast_forward=True):
         super().__init__(parent)
+        self.fast_forward = fast_forward
         self.setWindowTitle("Battle Dice - GUI Edition")
         self.setGeometry(100, 100, 900, 700)
         self.dice_types = dice_types
@@ -21,6 +47,8 @@ class BattleDiceGUI(QMainWindow):
         self.dice_results = [1 for _ in dice_types]
         self.selected_dice = set()
         self.rerolls_left = 3
+        self.thread_pool = QThreadPool.globalInstance()
+        self.workers = set()
         self.init_ui()
         self.init_physics()
 
@@ -105,78 +133,67 @@ class BattleDiceGUI(QMainWindow):
         QGraphicsScene.mousePressEvent(self.scene, event)
 
     def init_physics(self):
-        self.space = pymunk.Space()
-        self.space.gravity = (0.0, 900.0)
-        # Add floor (ground)
-        floor = pymunk.Segment(self.space.static_body, (0, 390), (800, 390), 5)
-        floor.friction = 0.8
-        floor.elasticity = 0.6  # Make ground bouncy
-        self.space.add(floor)
-        # Add left wall
-        left_wall = pymunk.Segment(self.space.static_body, (0, 0), (0, 400), 5)
-        left_wall.friction = 0.8
-        left_wall.elasticity = 0.6
-        self.space.add(left_wall)
-        # Add right wall
-        right_wall = pymunk.Segment(self.space.static_body, (800, 0), (800, 400), 5)
-        right_wall.friction = 0.8
-        right_wall.elasticity = 0.6
-        self.space.add(right_wall)
+        # Pooled bodies and a single frame timer, reused for every roll
+        self.physics = DicePhysics(len(self.dice_types))
+        self.dice_bodies = [(body, sides) for body, sides in zip(self.physics.bodies, self.dice_types)]
+        self.space = self.physics.space
+        self.replay_frames = None
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.update_physics)
+
+    def run_in_background(self, fn, *args, on_done=None, on_error=None):
+        # Keep a reference until the worker reports, so its signals stay alive
+        worker = Worker(fn, *args)
+        worker.setAutoDelete(False)
+        self.workers.add(worker)
+
+        def finish(handler, value):
+            self.workers.discard(worker)
+            if handler:
+                handler(value)
+        worker.signals.finished.connect(lambda result: finish(on_done, result))
+        worker.signals.failed.connect(lambda message: finish(on_error or self.show_error, message))
+        self.thread_pool.start(worker)
+
+    def show_error(self, message):
+        self.info_label.setText(f"Error: {message}")
+
+    def start_physics(self, indices=None, spin=False):
+        if self.fast_forward:
+            # Settle the throw on a worker thread, then only replay poses at display rate
+            self.run_in_background(self.physics.simulate, indices, spin, on_done=self.replay)
+            return
+        self.physics.throw(indices, spin)
+        if not self.timer.isActive():
+            self.timer.start(16)
+
+    def replay(self, frames):
+        self.replay_frames = iter(frames)
+        if not self.timer.isActive():
+            self.timer.start(16)
 
     def roll_dice(self):
         self.clear_dice()
-        self.dice_bodies = []
         self.dice_results = []
-        for i, sides in enumerate(self.dice_types):
-            body = pymunk.Body(1, pymunk.moment_for_box(1, (60, 60)))
-            x = 150 + i*200 + random.randint(-20, 20)
-            y = 50
-            body.position = (x, y)
-            body.angle = random.uniform(0, 3.14)
-            # Give dice a strong upward and sideways impulse for bounciness
-            body.apply_impulse_at_local_point((random.uniform(-120, 120), random.uniform(350, 500)))
-            shape = pymunk.Poly.create_box(body, (60, 60))
-            shape.friction = 0.9
-            shape.elasticity = 0.5  # More realistic bounce
-            shape.collision_type = 1
-            shape.filter = pymunk.ShapeFilter(group=1)
-            self.space.add(body, shape)
-            self.dice_bodies.append((body, sides))
-        # Add top wall to prevent dice from going off the top
-        if not hasattr(self, 'top_wall'):
-            self.top_wall = pymunk.Segment(self.space.static_body, (0, 0), (800, 0), 5)
-            self.top_wall.friction = 0.8
-            self.top_wall.elasticity = 0.5
-            self.space.add(self.top_wall)
-        self.timer = QTimer()
-        self.timer.timeout.connect(self.update_physics)
-        self.timer.start(16)
+        self.start_physics()
         self.roll_button.setEnabled(False)
         self.reroll_button.setEnabled(False)
         self.info_label.setText(f"Rolling... Target: {self.target}")
 
     def update_physics(self):
-        self.space.step(1/60.0)
-        for i, (body, sides) in enumerate(self.dice_bodies):
-            # Clamp dice to stay within the screen horizontally
-            if body.position.x < 30:
-                body.position = (30, body.position.y)
-                body.velocity = (abs(body.velocity.x), body.velocity.y)
-            elif body.position.x > 770:
-                body.position = (770, body.position.y)
-                body.velocity = (-abs(body.velocity.x), body.velocity.y)
-            # Clamp dice to stay within the screen vertically
-            if body.position.y < 30:
-                body.position = (body.position.x, 30)
-                body.velocity = (body.velocity.x, abs(body.velocity.y))
-            pos = body.position
-            self.dice_items[i].setPos(pos.x, pos.y)
-            self.dice_items[i].setRotation(body.angle * 180 / 3.14159)
-        # Only stop if all dice are on the ground (not wall) and moving slowly
-        def is_on_ground(body):
-            # Consider on ground if y is near floor and not near left/right wall
-            return body.position.y > 370 and 30 < body.position.x < 770
-        if all(is_on_ground(body) and abs(body.velocity.y) < 5 and abs(body.velocity.x) < 5 for body, _ in self.dice_bodies):
+        if self.fast_forward:
+            poses = next(self.replay_frames, None)
+            if poses is None:
+                self.timer.stop()
+                self.show_dice_results()
+                return
+        else:
+            self.physics.step()
+            poses = self.physics.poses()
+        for i, (x, y, angle) in enumerate(poses):
+            self.dice_items[i].setPos(x, y)
+            self.dice_items[i].setRotation(angle * 180 / 3.14159)
+        if not self.fast_forward and self.physics.settled():
             self.timer.stop()
             self.show_dice_results()
 
@@ -184,7 +201,7 @@ class BattleDiceGUI(QMainWindow):
         # Assign random value for each die (simulate physics result)
         self.dice_results = []  # Reset to correct length
         for i, (body, sides) in enumerate(self.dice_bodies):
-            val = random.randint(1, sides)
+            val = roll_die(sides)
             self.dice_results.append(val)
             self.dice_labels[i].setText(f"d{sides}: {val}")
             # Highlight selection state
@@ -207,23 +224,14 @@ class BattleDiceGUI(QMainWindow):
             return
         if len(self.dice_results) != len(self.dice_types):
             self.dice_results = [1 for _ in self.dice_types]
-        for idx in self.selected_dice:
-            body, sides = self.dice_bodies[idx]
-            # Respawn die at top and give new momentum
-            body.position = (150 + idx*200 + random.randint(-20, 20), 50)
-            body.velocity = (0, 0)
-            body.angle = random.uniform(0, 3.14)
-            body.angular_velocity = random.uniform(-5, 5)
-            body.apply_impulse_at_local_point((random.uniform(-120, 120), random.uniform(350, 500)))
+        # Respawn selected dice at top and give new momentum
+        self.start_physics(sorted(self.selected_dice), spin=True)
         self.rerolls_left -= 1
         self.info_label.setText(f"Target: {self.target} | Rerolls left: {self.rerolls_left}")
         self.selected_dice.clear()
         for item in self.dice_items:
             item.setOpacity(1.0)
         self.reroll_button.setEnabled(False)
-        self.timer = QTimer()
-        self.timer.timeout.connect(self.update_physics)
-        self.timer.start(16)
 
     def clear_dice(self):
         for item in self.dice_items:
@@ -234,11 +242,214 @@ class BattleDiceGUI(QMainWindow):
             label.setText(f"d{sides}: ?")
         self.selected_dice.clear()
 
-    # Add more methods for full game integration as needed
 
-# To run standalone for testing:
+
+class BattleDiceGameGUI(BattleDiceGUI):
+    """
+    Full 7-round match against the AI with the play_game rules; the human is
+    Player 1. Model loading, AI turns and physics run on the thread pool and
+    report back through signals, so the UI thread only replays frames.
+    """
+    def __init__(self, coll_key="A", parent=None, log_path="battle_dice_pvp_log.jsonl", response=True):
+        collection = COLLECTIONS[coll_key]
+        self.coll_key = coll_key
+        self.max_rerolls = max(collection["rerolls"])
+        self.response = response
+        self.log_path = log_path
+        super().__init__(collection["dice"], collection["target"], parent, fast_forward=True)
+        self.setWindowTitle(f"Battle Dice - Collection {coll_key} vs AI")
+        self.stand_button = QPushButton("Stand")
+        self.stand_button.clicked.connect(self.end_human_turn)
+        self.button_box.addWidget(self.stand_button)
+        self.score_label = QLabel()
+        self.score_label.setFont(QFont('Arial', 14))
+        self.vbox.insertWidget(1, self.score_label)
+
+        self.dice_source = default_source()
+        self.ai_player = None
+        self.log_sink = None
+        self.final_score = {"Player 1": 0, "Player 2": 0}
+        self.player_order = ["Player 1", "Player 2"]
+        self.round_num = 0
+        self.rolls = []
+        self.ai_segments = []
+        self.human_can_act = False
+        self.set_controls(False)
+        self.info_label.setText("Loading AI...")
+        self.run_in_background(lambda: load_ai_player(coll_key, COLLECTIONS, response=response),
+                               on_done=self.on_ai_loaded)
+
+    def set_controls(self, rolling=False, rerolling=False, standing=False):
+        self.human_can_act = standing
+        self.roll_button.setEnabled(rolling)
+        self.reroll_button.setEnabled(rerolling)
+        self.stand_button.setEnabled(standing)
+
+    def on_ai_loaded(self, ai_player):
+        self.ai_player = ai_player
+        self.log_sink = open_log_sink(self.log_path, max_rerolls=self.max_rerolls)
+        self.log_sink.start_game(self.coll_key, self.dice_types, self.target)
+        self.start_round()
+
+    def start_round(self):
+        self.round_num += 1
+        self.round_sums = {}
+        self.round_logs = {}
+        self.update_score_label()
+        self.start_turn()
+
+    def current_player(self):
+        return self.player_order[len(self.round_sums)]
+
+    def start_turn(self):
+        player = self.current_player()
+        self.rerolls_left = COLLECTIONS[self.coll_key]["rerolls"][len(self.round_sums)]
+        self.clear_dice()
+        if player == "Player 1":
+            self.info_label.setText(f"Round {self.round_num}: your turn ({self.rerolls_left} rerolls). Roll the dice!")
+            self.set_controls(rolling=True)
+        else:
+            self.info_label.setText(f"Round {self.round_num}: AI is thinking...")
+            self.set_controls()
+            # Moving second, the AI plays against the human's known final sum
+            self.run_in_background(self.play_ai_turn, self.rerolls_left, self.round_sums.get("Player 1"),
+                                   on_done=self.on_ai_turn)
+
+    # Human turn
+
+    def handle_dice_click(self, event):
+        super().handle_dice_click(event)
+        self.reroll_button.setEnabled(self.human_can_act and self.rerolls_left > 0 and len(self.selected_dice) == 1)
+
+    def roll_dice(self):
+        self.set_controls()
+        self.rolls = self.dice_source.roll_dice(self.dice_types)
+        self.turn_log = [{"roll": self.rolls[:], "dice": self.dice_types, "sum": sum(self.rolls),
+                          "rerolls_left": self.rerolls_left}]
+        self.info_label.setText(f"Rolling... Target: {self.target}")
+        self.start_physics()
+
+    def reroll_selected(self):
+        # One die per reroll, as in play_game
+        if not self.human_can_act or self.rerolls_left <= 0 or len(self.selected_dice) != 1:
+            QMessageBox.information(self, "Reroll", "Select exactly one die to reroll.")
+            return
+        index = next(iter(self.selected_dice))
+        self.set_controls()
+        old_val = self.rolls[index]
+        self.rolls[index] = self.dice_source.roll(self.dice_types[index])
+        self.rerolls_left -= 1
+        self.turn_log.append({"roll": self.rolls[:], "dice": self.dice_types, "sum": sum(self.rolls),
+                              "rerolls_left": self.rerolls_left,
+                              "reroll_info": {"index": index, "old": old_val, "new": self.rolls[index]}})
+        self.selected_dice.clear()
+        self.start_physics([index], spin=True)
+
+    def show_dice_results(self):
+        if self.ai_segments:
+            self.show_ai_step()
+            return
+        self.display_rolls(self.rolls)
+        if self.current_player() == "Player 1":
+            self.info_label.setText(f"Round {self.round_num}: sum {sum(self.rolls)} | Target: {self.target} | "
+                                    f"Rerolls left: {self.rerolls_left}")
+            self.set_controls(rerolling=self.rerolls_left > 0 and len(self.selected_dice) == 1, standing=True)
+            if self.rerolls_left == 0:
+                self.end_human_turn()
+
+    def display_rolls(self, rolls):
+        self.dice_results = list(rolls)
+        for i, (sides, val) in enumerate(zip(self.dice_types, rolls)):
+            self.dice_labels[i].setText(f"d{sides}: {val}")
+            self.dice_items[i].setBrush(QBrush(QColor(200, 255, 200)) if i in self.selected_dice else QBrush(Qt.white))
+        self.scene.update()
+
+    def end_human_turn(self):
+        self.set_controls()
+        self.finish_turn(sum(self.rolls), self.turn_log)
+
+    # AI turn (worker thread)
+
+    def play_ai_turn(self, rerolls, opponent_sum=None):
+        # Decide the whole turn and precompute its animation off the UI thread
+        rolls, total, log = self.ai_player.play_turn("Player 2", self.dice_types, rerolls, opponent_sum)
+        segments = [(self.physics.simulate(), log[0])]
+        for step in log[1:]:
+            segments.append((self.physics.simulate([step["reroll_info"]["index"]], True), step))
+        return total, log, segments
+
+    def on_ai_turn(self, result):
+        total, self.ai_log, segments = result
+        self.ai_total = total
+        self.ai_segments = list(segments)
+        frames, _ = self.ai_segments[0]
+        self.replay(frames)
+
+    def show_ai_step(self):
+        _, step = self.ai_segments.pop(0)
+        self.display_rolls(step["roll"])
+        if "reroll_info" in step:
+            info = step["reroll_info"]
+            self.info_label.setText(f"AI rerolled d{self.dice_types[info['index']]} from {info['old']} "
+                                    f"to {info['new']} (sum={step['sum']})")
+        else:
+            self.info_label.setText(f"AI rolled {step['roll']} (sum={step['sum']})")
+        if self.ai_segments:
+            # Pause on each result before the next reroll
+            QTimer.singleShot(600, lambda: self.replay(self.ai_segments[0][0]))
+        else:
+            QTimer.singleShot(600, lambda: self.finish_turn(self.ai_total, self.ai_log))
+
+    # Round bookkeeping
+
+    def finish_turn(self, total, log):
+        player = self.current_player()
+        self.round_sums[player] = total
+        self.round_logs[player] = log
+        if len(self.round_sums) < 2:
+            self.start_turn()
+            return
+        winner, p1_pts, p2_pts = determine_round_winner(self.round_sums["Player 1"], self.round_sums["Player 2"],
+                                                        self.target)
+        self.final_score["Player 1"] += p1_pts
+        self.final_score["Player 2"] += p2_pts
+        round_data = {"round": self.round_num}
+        for p in self.player_order:
+            round_data[p] = {"log": self.round_logs[p], "final_sum": self.round_sums[p]}
+        round_data["winner"] = f"Player {winner}" if winner else "Draw"
+        self.log_sink.write_round(round_data)
+        self.info_label.setText(f"Round {self.round_num}: you {self.round_sums['Player 1']}, "
+                                f"AI {self.round_sums['Player 2']} => "
+                                f"{'Draw' if winner == 0 else ('You win' if winner == 1 else 'AI wins')}")
+        self.update_score_label()
+        # Alternate order
+        self.player_order.reverse()
+        if self.round_num < 7:
+            QTimer.singleShot(1500, self.start_round)
+        else:
+            QTimer.singleShot(1500, self.finish_game)
+
+    def update_score_label(self):
+        self.score_label.setText(f"Round {self.round_num}/7 | You: {self.final_score['Player 1']} | "
+                                 f"AI: {self.final_score['Player 2']}")
+
+    def finish_game(self):
+        self.log_sink.end_game(self.final_score)
+        self.log_sink.close()
+        p1, p2 = self.final_score["Player 1"], self.final_score["Player 2"]
+        outcome = "You win the game!" if p1 > p2 else ("The AI wins the game!" if p2 > p1 else "The game is a draw!")
+        self.info_label.setText(f"Final score {p1} - {p2}. {outcome}")
+        self.set_controls()
+
+
+# To run standalone for testing, or pass a collection key to play the AI:
 if __name__ == "__main__":
+    # python interface.py [collection] [--no-response]
     app = QApplication(sys.argv)
-    gui = BattleDiceGUI()
+    args = [arg for arg in sys.argv[1:] if arg != "--no-response"]
+    if args and args[0].upper() in COLLECTIONS:
+        gui = BattleDiceGameGUI(args[0].upper(), response="--no-response" not in sys.argv)
+    else:
+        gui = BattleDiceGUI()
     gui.show()
     sys.exit(app.exec_())
@@ -0,0 +1,252 @@
+import argparse
+import json
+import os
+import numpy as np
+from game_log import read_game_log
+
+# --- Columnar game-log index ---
+#
+# Logs are flattened into one raw binary file per column, appended in chunks
+# so ingestion memory stays bounded, and read back as np.memmap columns.
+# Two tables are kept: "steps" (one row per reroll) and "rounds" (one row per
+# round). meta.json records the dtypes, row counts and collection codes.
+
+STEP_COLUMNS = {
+    "game": np.uint32,
+    "round": np.uint8,
+    "collection": np.uint8,
+    "player": np.uint8,         # 1 or 2
+    "seat": np.uint8,           # 0 moved first, 1 moved second
+    "die_index": np.uint8,
+    "sides": np.uint8,
+    "old": np.uint8,
+    "new": np.uint8,
+    "rerolls_left": np.uint8,   # before this reroll
+    "sum_before": np.uint16,
+    "sum_after": np.uint16,
+    "final_sum": np.uint16,
+    "final_bust": np.bool_,
+}
+
+ROUND_COLUMNS = {
+    "game": np.uint32,
+    "round": np.uint8,
+    "collection": np.uint8,
+    "first_player": np.uint8,
+    "sum_first": np.uint16,
+    "sum_second": np.uint16,
+    "rerolls_first": np.uint8,  # rerolls used
+    "rerolls_second": np.uint8,
+    "winner": np.uint8,         # 0 draw, otherwise the player number
+}
+
+TABLES = {"steps": STEP_COLUMNS, "rounds": ROUND_COLUMNS}
+
+
+def _seat_rows(log):
+    # Reroll steps rebuilt from reroll_info, which every log format keeps intact
+    rolls = list(log[0]["roll"])
+    rerolls_left = log[0]["rerolls_left"]
+    steps = []
+    for step in log[1:]:
+        info = step["reroll_info"]
+        sum_before = sum(rolls)
+        rolls[info["index"]] = info["new"]
+        steps.append((info["index"], info["old"], info["new"], rerolls_left, sum_before, sum(rolls)))
+        rerolls_left -= 1
+    return steps, sum(rolls)
+
+
+class _ColumnWriter:
+    def __init__(self, index_dir, table, columns, chunk_rows):
+        self.paths = {name: os.path.join(index_dir, f"{table}.{name}.bin") for name in columns}
+        self.columns = columns
+        self.chunk_rows = chunk_rows
+        self.buffers = {name: [] for name in columns}
+        self.rows = 0
+
+    def append(self, row):
+        for name, value in zip(self.columns, row):
+            self.buffers[name].append(value)
+        if len(self.buffers["game"]) >= self.chunk_rows:
+            self.flush()
+
+    def flush(self):
+        count = len(self.buffers["game"])
+        if not count:
+            return
+        for name, dtype in self.columns.items():
+            with open(self.paths[name], "ab") as f:
+                np.asarray(self.buffers[name], dtype=dtype).tofile(f)
+            self.buffers[name] = []
+        self.rows += count
+
+
+def build_index(log_paths, index_dir, chunk_rows=1 << 20):
+    """
+    Ingest game logs (.json, .jsonl or .bdl) into index_dir, appending to an
+    existing index. Returns the LogIndex.
+    """
+    from battle_dice import COLLECTIONS
+    os.makedirs(index_dir, exist_ok=True)
+    meta_path = os.path.join(index_dir, "meta.json")
+    if os.path.exists(meta_path):
+        with open(meta_path) as f:
+            meta = json.load(f)
+    else:
+        meta = {"collections": {}, "games": 0, "rows": {table: 0 for table in TABLES},
+                "dtypes": {table: {name: np.dtype(dtype).str for name, dtype in columns.items()}
+                           for table, columns in TABLES.items()}}
+
+    writers = {table: _ColumnWriter(index_dir, table, columns, chunk_rows) for table, columns in TABLES.items()}
+    for table, writer in writers.items():
+        # Drop rows a failed ingest flushed past the committed row count
+        for name, path in writer.paths.items():
+            if os.path.exists(path):
+                with open(path, "r+b") as f:
+                    f.truncate(meta["rows"][table] * np.dtype(writer.columns[name]).itemsize)
+    game_id = meta["games"]
+    for path in log_paths:
+        for game in read_game_log(path):
+            key = game["collection"]
+            code = meta["collections"].setdefault(key, {"code": len(meta["collections"]),
+                                                        "target": COLLECTIONS[key]["target"]})["code"]
+            target = COLLECTIONS[key]["target"]
+            dice_types = COLLECTIONS[key]["dice"]
+            for round_data in game["rounds"]:
+                seats = [name for name, value in round_data.items() if isinstance(value, dict)]
+                finals, used = [], []
+                for seat, name in enumerate(seats):
+                    steps, final_sum = _seat_rows(round_data[name]["log"])
+                    player = int(name.split()[-1])
+                    for index, old, new, rerolls_left, sum_before, sum_after in steps:
+                        writers["steps"].append((game_id, round_data["round"], code, player, seat, index,
+                                                 dice_types[index], old, new, rerolls_left, sum_before,
+                                                 sum_after, final_sum, final_sum > target))
+                    finals.append(final_sum)
+                    used.append(len(steps))
+                winner = round_data["winner"]
+                writers["rounds"].append((game_id, round_data["round"], code, int(seats[0].split()[-1]),
+                                          finals[0], finals[1], used[0], used[1],
+                                          0 if winner == "Draw" else int(winner.split()[-1])))
+            game_id += 1
+
+    for table, writer in writers.items():
+        writer.flush()
+        meta["rows"][table] += writer.rows
+    meta["games"] = game_id
+    # meta.json commits the new rows, so it is replaced atomically
+    tmp_path = meta_path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(meta, f, indent=2)
+    os.replace(tmp_path, meta_path)
+    return LogIndex(index_dir)
+
+
+class LogIndex:
+    """
+    Read-only view of an index built by build_index.
+    Filters map a column to a value or a list of accepted values; the
+    "collection" column also accepts collection keys such as "A".
+    """
+    def __init__(self, index_dir, chunk_rows=1 << 22):
+        self.index_dir = index_dir
+        self.chunk_rows = chunk_rows
+        with open(os.path.join(index_dir, "meta.json")) as f:
+            self.meta = json.load(f)
+        self.collection_keys = {info["code"]: key for key, info in self.meta["collections"].items()}
+
+    def column(self, table, name):
+        rows = self.meta["rows"][table]
+        dtype = np.dtype(self.meta["dtypes"][table][name])
+        if rows == 0:
+            return np.zeros(0, dtype=dtype)
+        return np.memmap(os.path.join(self.index_dir, f"{table}.{name}.bin"), dtype=dtype, mode="r", shape=(rows,))
+
+    def _filter_value(self, name, value):
+        if name == "collection":
+            codes = [self.meta["collections"][v]["code"] if isinstance(v, str) else v
+                     for v in (value if isinstance(value, (list, tuple, set)) else [value])]
+            return codes
+        return value
+
+    def _chunks(self, table, names):
+        # Bounded-memory scan: yields dicts of column slices
+        columns = {name: self.column(table, name) for name in names}
+        for start in range(0, self.meta["rows"][table], self.chunk_rows):
+            yield {name: np.asarray(col[start:start + self.chunk_rows]) for name, col in columns.items()}
+
+    def _mask(self, chunk, filters):
+        mask = np.ones(len(next(iter(chunk.values()))), dtype=bool)
+        for name, value in filters.items():
+            value = self._filter_value(name, value)
+            if isinstance(value, (list, tuple, set)):
+                mask &= np.isin(chunk[name], list(value))
+            else:
+                mask &= chunk[name] == value
+        return mask
+
+    def count(self, table, **filters):
+        total = 0
+        for chunk in self._chunks(table, list(filters) or ["game"]):
+            total += int(self._mask(chunk, filters).sum())
+        return total
+
+    def aggregate(self, table, value, by=(), **filters):
+        """
+        Group rows matching filters by the `by` columns and return
+        {group: (count, mean of value)}, groups being tuples of column values.
+        """
+        by = list(by)
+        sums, counts = {}, {}
+        for chunk in self._chunks(table, set(by) | set(filters) | {value}):
+            mask = self._mask(chunk, filters)
+            values = chunk[value][mask].astype(np.float64)
+            if by:
+                keys = np.stack([chunk[name][mask].astype(np.int64) for name in by], axis=1)
+                groups, inverse = np.unique(keys, axis=0, return_inverse=True)
+                inverse = inverse.ravel()
+                group_sums = np.bincount(inverse, weights=values, minlength=len(groups))
+                group_counts = np.bincount(inverse, minlength=len(groups))
+            else:
+                groups = np.zeros((1, 0), dtype=np.int64)
+                group_sums, group_counts = [values.sum()], [len(values)]
+            for group, s, c in zip(map(tuple, groups.tolist()), group_sums, group_counts):
+                sums[group] = sums.get(group, 0.0) + s
+                counts[group] = counts.get(group, 0) + int(c)
+        result = {}
+        for group in sorted(counts):
+            if not counts[group]:
+                continue
+            label = group
+            if "collection" in by:
+                i = by.index("collection")
+                label = group[:i] + (self.collection_keys[group[i]],) + group[i + 1:]
+            result[label] = (counts[group], float(sums[group] / counts[group]))
+        return result
+
+    def bust_rate(self, by=("collection", "die_index", "old", "rerolls_left"), **filters):
+        # Share of rerolls whose turn ended over the target, grouped by `by`
+        return self.aggregate("steps", "final_bust", by=by, **filters)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Columnar index over Battle Dice game logs.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build", help="ingest logs into an index directory")
+    build.add_argument("index_dir")
+    build.add_argument("logs", nargs="+")
+    bust = sub.add_parser("bust-rate", help="bust rate of rerolls grouped by columns")
+    bust.add_argument("index_dir")
+    bust.add_argument("--by", nargs="+", default=["collection", "die_index", "old", "rerolls_left"])
+    args = parser.parse_args()
+
+    if args.command == "build":
+        index = build_index(args.logs, args.index_dir)
+        print(f"Indexed {index.meta['games']} games, {index.meta['rows']['steps']} reroll steps, "
+              f"{index.meta['rows']['rounds']} rounds")
+    else:
+        index = LogIndex(args.index_dir)
+        print(" ".join(args.by), "count bust_rate")
+        for group, (count, rate) in index.bust_rate(by=args.by).items():
+            print(" ".join(str(g) for g in group), count, f"{rate:.4f}")
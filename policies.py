@@ -0,0 +1,73 @@
+import random
+from dice import default_source
+
+# --- Reroll policies ---
+#
+# A policy maps (rolls, rerolls_left) to an action using the DQN encoding:
+# 0..n-1 rerolls that die, n stops. BattleDiceAIPlayer follows the same
+# interface through its choose_action method. The second mover is also told
+# the first mover's final sum, which opponent-aware policies may use.
+
+
+class HeuristicPolicy:
+    # Same rule as BattleDiceEnv._heuristic_play
+    def __init__(self, dice_types, target):
+        self.dice_types = dice_types
+        self.target = target
+
+    def choose_action(self, rolls, rerolls_left, opponent_sum=None):
+        current_sum = sum(rolls)
+        if current_sum > self.target:
+            return rolls.index(max(rolls))
+        elif current_sum < self.target - 4:
+            return rolls.index(min(rolls))
+        return len(self.dice_types)
+
+
+class RandomPolicy:
+    def __init__(self, dice_types, target):
+        self.dice_types = dice_types
+
+    def choose_action(self, rolls, rerolls_left, opponent_sum=None):
+        return random.randrange(len(self.dice_types) + 1)
+
+    def action_probabilities(self, rolls, rerolls_left):
+        return [1.0 / (len(self.dice_types) + 1)] * (len(self.dice_types) + 1)
+
+
+def make_policy(spec, dice_types, target, max_rerolls=3):
+    """
+    Build a policy from a picklable spec string:
+    "heuristic", "random", "table" (exact solver), "response" (exact solver
+    that also best-replies to a known opponent sum) or "dqn:<model_path>".
+    max_rerolls is the largest reroll budget the policy will be asked about.
+    """
+    if spec == "heuristic":
+        return HeuristicPolicy(dice_types, target)
+    if spec == "random":
+        return RandomPolicy(dice_types, target)
+    # AI backends are only imported when asked for
+    from ai_player import BattleDiceAIPlayer
+    if spec == "table":
+        return BattleDiceAIPlayer(dice_types, target, max_rerolls=max_rerolls)
+    if spec == "response":
+        from solver import solve_response_policy
+        return BattleDiceAIPlayer(dice_types, target, max_rerolls=max_rerolls,
+                                  response_table=solve_response_policy(dice_types, target, max_rerolls)[0])
+    if spec.startswith("dqn:"):
+        return BattleDiceAIPlayer(dice_types, target, spec[len("dqn:"):], max_rerolls=max_rerolls)
+    raise ValueError(f"Unknown policy spec: {spec!r}")
+
+
+def play_policy_turn(policy, dice_types, rerolls, dice_source=None, opponent_sum=None):
+    # play_turn without logging, returns the final rolls
+    dice_source = dice_source or default_source()
+    rolls = dice_source.roll_dice(dice_types)
+    stop = len(dice_types)
+    while rerolls > 0:
+        action = policy.choose_action(rolls, rerolls, opponent_sum)
+        if action == stop:
+            break
+        rolls[action] = dice_source.roll(dice_types[action])
+        rerolls -= 1
+    return rolls
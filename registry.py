@@ -0,0 +1,236 @@
+import argparse
+import hashlib
+import json
+import os
+import time
+import numpy as np
+from solver import solve_policy, solve_response_policy
+
+# --- Dice collection registry and artifact cache ---
+#
+# Collections are read from dice_collections.json (or the file named by
+# BATTLE_DICE_COLLECTIONS): any number of dice with any sides, a target and
+# the reroll budgets of the first and second mover.
+#
+# Anything derived from a collection (trained models, compiled policy tables,
+# exact outcome distributions) lives in a content-addressed cache directory
+# named after a hash of the collection definition, so renaming a collection
+# or adding new ones never invalidates work that is already cached. Trained
+# models are versioned there by ModelRegistry and looked up by tag.
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+CONFIG_PATH = os.path.join(HERE, "dice_collections.json")
+CACHE_DIR = os.path.join(HERE, ".battle_dice_cache")
+DEFAULT_REROLLS = (3, 2)
+# The shipped battle_dice_dqn_A/B models were trained on exactly these definitions
+# (A: dice [4, 8, 12] target 14, B: dice [6, 10, 20] target 21, rerolls [3, 2])
+LEGACY_MODEL_DIGESTS = {"A": "e9d44489b6e6f161", "B": "cb916e6862dfc6ce"}
+
+
+def normalize_collection(collection):
+    # Canonical form of a collection definition; raises ValueError when invalid
+    dice_types = [int(sides) for sides in collection["dice"]]
+    target = int(collection["target"])
+    rerolls = [int(r) for r in collection.get("rerolls", DEFAULT_REROLLS)]
+    if not dice_types or min(dice_types) < 2:
+        raise ValueError(f"Collection needs at least one die with 2 or more sides: {collection}")
+    if len(rerolls) != 2 or min(rerolls) < 0:
+        raise ValueError(f"rerolls must be [first mover, second mover] budgets: {collection}")
+    return {"dice": dice_types, "target": target, "rerolls": rerolls}
+
+
+def load_collections(path=None):
+    path = path or os.environ.get("BATTLE_DICE_COLLECTIONS", CONFIG_PATH)
+    with open(path) as f:
+        config = json.load(f)
+    return {str(key): normalize_collection(collection) for key, collection in config.items()}
+
+
+def collection_digest(collection):
+    definition = json.dumps(normalize_collection(collection), sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(definition.encode()).hexdigest()[:16]
+
+
+class ArtifactCache:
+    """
+    One directory per collection definition under root, holding the
+    definition itself (collection.json) next to its artifacts.
+    """
+    def __init__(self, root=None):
+        self.root = root or os.environ.get("BATTLE_DICE_CACHE", CACHE_DIR)
+
+    def directory(self, collection):
+        path = os.path.join(self.root, collection_digest(collection))
+        if not os.path.exists(os.path.join(path, "collection.json")):
+            os.makedirs(path, exist_ok=True)
+            self._write_atomic(os.path.join(path, "collection.json"),
+                               lambda f: f.write(json.dumps(normalize_collection(collection)).encode()))
+        return path
+
+    def path(self, collection, name):
+        return os.path.join(self.directory(collection), name)
+
+    def _write_atomic(self, path, write):
+        # Concurrent writers race harmlessly: readers only ever see complete files
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            write(f)
+        os.replace(tmp_path, path)
+
+    def arrays(self, collection, name, build):
+        """
+        Return the dict of arrays cached as <name>.npz, calling build() to
+        compute and store it on a miss.
+        """
+        path = self.path(collection, f"{name}.npz")
+        if os.path.exists(path):
+            with np.load(path) as data:
+                return {key: data[key] for key in data.files}
+        arrays = {key: np.asarray(value) for key, value in build().items()}
+        self._write_atomic(path, lambda f: np.savez_compressed(f, **arrays))
+        return arrays
+
+    def find_model(self, collection, key=None, tag="latest"):
+        """
+        Path of the model tagged `tag` in the model registry. For "latest",
+        the legacy per-key files in the repo root are used when the registry
+        has no model yet and the collection still has the definition they
+        were trained on; any other tag must exist.
+        """
+        path = ModelRegistry(self).resolve(collection, tag)
+        if path is not None or tag != "latest":
+            if path is None:
+                raise KeyError(f"No model tagged {tag!r} for collection {collection}")
+            return path
+        if key is None or LEGACY_MODEL_DIGESTS.get(key) != collection_digest(collection):
+            return None
+        candidates = [os.path.join(HERE, f"battle_dice_dqn_{key}.npz"), os.path.join(HERE, f"battle_dice_dqn_{key}.pth")]
+        return next((path for path in candidates if os.path.exists(path)), None)
+
+    def exact_policy(self, collection):
+        collection = normalize_collection(collection)
+        return self.arrays(collection, "policy_exact", lambda: {
+            "policy": solve_policy(collection["dice"], collection["target"], max(collection["rerolls"]))[0]})["policy"]
+
+    def response_policy(self, collection):
+        # Exact second-mover table indexed by the first mover's final sum
+        collection = normalize_collection(collection)
+        return self.arrays(collection, "policy_response", lambda: {
+            "policy": solve_response_policy(collection["dice"], collection["target"],
+                                            max(collection["rerolls"]))[0]})["policy"]
+
+
+class ModelRegistry:
+    """
+    Versioned DQN models per collection, kept in the collection's cache
+    directory as models/v<N>.npz plus models/index.json, which records each
+    version's metadata and the tags ("latest", "best", ...) pointing at
+    versions. A version can also be addressed directly as "v<N>".
+    """
+    def __init__(self, cache=None):
+        self.cache = cache or ArtifactCache()
+
+    def directory(self, collection):
+        path = self.cache.path(collection, "models")
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def index(self, collection):
+        path = os.path.join(self.directory(collection), "index.json")
+        if not os.path.exists(path):
+            return {"versions": [], "tags": {}}
+        with open(path) as f:
+            return json.load(f)
+
+    def _save_index(self, collection, index):
+        self.cache._write_atomic(os.path.join(self.directory(collection), "index.json"),
+                                 lambda f: f.write(json.dumps(index, indent=2).encode()))
+
+    def publish(self, collection, model_path, tags=("latest",), **metadata):
+        # Store a copy of the model's weights as the next version; returns its number
+        from ai_player import load_weights
+        weights = load_weights(model_path)
+        index = self.index(collection)
+        version = max((entry["version"] for entry in index["versions"]), default=0) + 1
+        path = os.path.join(self.directory(collection), f"v{version}.npz")
+        self.cache._write_atomic(path, lambda f: np.savez(f, **weights))
+        index["versions"].append({"version": version, "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                                  "source": os.path.abspath(model_path), **metadata})
+        for tag in tags:
+            index["tags"][tag] = version
+        self._save_index(collection, index)
+        return version
+
+    def tag(self, collection, version, tag):
+        index = self.index(collection)
+        if version not in (entry["version"] for entry in index["versions"]):
+            raise KeyError(f"No model version {version}")
+        index["tags"][tag] = version
+        self._save_index(collection, index)
+
+    def resolve(self, collection, tag="latest"):
+        # Path of a tag or "v<N>", None when it does not exist
+        index = self.index(collection)
+        if tag.startswith("v") and tag[1:].isdigit():
+            version = int(tag[1:])
+        else:
+            version = index["tags"].get(tag)
+        path = os.path.join(self.directory(collection), f"v{version}.npz")
+        return path if version is not None and os.path.exists(path) else None
+
+
+def load_ai_player(key, collections=None, cache=None, dice_source=None, tag="latest", response=True):
+    """
+    BattleDiceAIPlayer for a registered collection: the model tagged `tag`
+    when one exists, else the exact policy, all reused from the cache. The
+    exact second-mover response table is attached for when the AI moves
+    second and knows the opponent's sum; with response=False the model (or
+    exact policy) plays that seat blind.
+    """
+    from ai_player import BattleDiceAIPlayer
+    collection = (collections or load_collections())[key]
+    cache = cache or ArtifactCache()
+    max_rerolls = max(collection["rerolls"])
+    model_path = cache.find_model(collection, key, tag)
+    response_table = cache.response_policy(collection) if response else None
+    if model_path is None:
+        return BattleDiceAIPlayer(collection["dice"], collection["target"], max_rerolls=max_rerolls,
+                                  policy_table=cache.exact_policy(collection), dice_source=dice_source,
+                                  response_table=response_table)
+    return BattleDiceAIPlayer(collection["dice"], collection["target"], model_path, max_rerolls=max_rerolls,
+                              dice_source=dice_source, cache_dir=cache.directory(collection),
+                              response_table=response_table, rerolls_scale=max(collection["rerolls"]))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Battle Dice collections, cached artifacts and model versions.")
+    sub = parser.add_subparsers(dest="command")
+    sub.add_parser("list", help="list collections, cached artifacts and model tags (default)")
+    publish = sub.add_parser("publish", help="add a trained model as a new version")
+    publish.add_argument("collection")
+    publish.add_argument("model_path")
+    publish.add_argument("--tag", action="append", default=None, help="tags to point at it (default: latest)")
+    tag = sub.add_parser("tag", help="point a tag at an existing version")
+    tag.add_argument("collection")
+    tag.add_argument("version", type=int)
+    tag.add_argument("tag")
+    args = parser.parse_args()
+
+    collections = load_collections()
+    models = ModelRegistry()
+    if args.command == "publish":
+        version = models.publish(collections[args.collection], args.model_path, args.tag or ["latest"])
+        print(f"Published {args.model_path} as collection {args.collection} v{version}")
+    elif args.command == "tag":
+        models.tag(collections[args.collection], args.version, args.tag)
+        print(f"Tagged collection {args.collection} v{args.version} as {args.tag}")
+    else:
+        for key, collection in collections.items():
+            directory = models.cache.directory(collection)
+            cached = sorted(name for name in os.listdir(directory) if name not in ("collection.json", "models"))
+            print(f"{key}: dice {collection['dice']} target {collection['target']} rerolls {collection['rerolls']} "
+                  f"-> {os.path.relpath(directory)} [{', '.join(cached) or 'empty'}]")
+            index = models.index(collection)
+            if index["versions"]:
+                tags = ", ".join(f"{name}=v{version}" for name, version in sorted(index["tags"].items()))
+                print(f"   models: {len(index['versions'])} versions, tags {tags}")
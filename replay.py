@@ -0,0 +1,229 @@
+import argparse
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from battle_dice import COLLECTIONS, determine_round_winner
+from dice import DiceSource
+from game_log import read_game_log
+from policies import make_policy
+
+# --- Replay and counterfactual re-simulation of game logs ---
+#
+# replay_game rebuilds every turn of a logged game from its initial roll and
+# reroll_info steps, re-scores the rounds with determine_round_winner and
+# reports where the logged final sums, winners or scores disagree.
+#
+# resimulate_game re-plays a logged game with a policy substituted for one
+# player; the other player's turns stay as logged. The substitute starts from
+# the logged initial roll with the logged reroll budget, and gets the logged
+# first mover's sum when it moves second. A reroll of a die the original
+# player also rerolled reuses the logged result (in order), so a substitute
+# that plays like the original reproduces the game exactly; other rerolls
+# come from a DiceSource substream keyed by (log, game, round), so
+# re-simulation is deterministic for a given seed. Logs are keyed by their
+# content, so the same log gives the same results wherever it is read from.
+
+PLAYERS = ("Player 1", "Player 2")
+
+
+def replay_turn(log):
+    """
+    Rebuild a turn from its log steps. Returns (rolls, rerolls_used,
+    consistent), consistent being False when a step's "old" value does not
+    match the die it replaced.
+    """
+    rolls = list(log[0]["roll"])
+    consistent = True
+    for step in log[1:]:
+        info = step["reroll_info"]
+        consistent &= rolls[info["index"]] == info["old"]
+        rolls[info["index"]] = info["new"]
+    return rolls, len(log) - 1, consistent
+
+
+def turn_order(round_data):
+    # Seats appear in the round record in the order they moved
+    return [key for key, value in round_data.items() if isinstance(value, dict)]
+
+
+def _score(sums, target):
+    winner, pts_1, pts_2 = determine_round_winner(sums["Player 1"], sums["Player 2"], target)
+    return (f"Player {winner}" if winner else "Draw"), {"Player 1": pts_1, "Player 2": pts_2}
+
+
+def replay_game(game, collections=COLLECTIONS):
+    """
+    Re-score a game in the battle_dice_pvp_log.json schema. Returns a dict
+    with the replayed rounds (order, sums, winner), the replayed final score
+    and a list of mismatches against the logged values.
+    """
+    target = collections[game["collection"]]["target"]
+    score = dict.fromkeys(PLAYERS, 0)
+    rounds, mismatches = [], []
+    for round_data in game["rounds"]:
+        sums = {}
+        for player in turn_order(round_data):
+            rolls, _, consistent = replay_turn(round_data[player]["log"])
+            sums[player] = sum(rolls)
+            if not consistent:
+                mismatches.append({"round": round_data["round"], "player": player, "field": "reroll_info"})
+            if round_data[player]["final_sum"] != sums[player]:
+                mismatches.append({"round": round_data["round"], "player": player, "field": "final_sum",
+                                   "logged": round_data[player]["final_sum"], "replayed": sums[player]})
+        winner, points = _score(sums, target)
+        if round_data["winner"] != winner:
+            mismatches.append({"round": round_data["round"], "field": "winner",
+                               "logged": round_data["winner"], "replayed": winner})
+        for player in PLAYERS:
+            score[player] += points[player]
+        rounds.append({"round": round_data["round"], "order": turn_order(round_data), "sums": sums,
+                       "winner": winner})
+    if game.get("final_score") and game["final_score"] != score:
+        mismatches.append({"field": "final_score", "logged": game["final_score"], "replayed": score})
+    return {"collection": game["collection"], "rounds": rounds, "final_score": score, "mismatches": mismatches}
+
+
+def resimulate_turn(policy, log, dice_types, dice_source, opponent_sum=None):
+    # Play the logged turn again with policy, reusing logged rerolls per die
+    rolls = list(log[0]["roll"])
+    rerolls = log[0]["rerolls_left"]
+    logged = {}
+    for step in log[1:]:
+        logged.setdefault(step["reroll_info"]["index"], []).append(step["reroll_info"]["new"])
+    for values in logged.values():
+        values.reverse()
+    stop = len(dice_types)
+    while rerolls > 0:
+        action = policy.choose_action(rolls, rerolls, opponent_sum)
+        if action == stop:
+            break
+        rolls[action] = logged[action].pop() if logged.get(action) else dice_source.roll(dice_types[action])
+        rerolls -= 1
+    return rolls
+
+
+def resimulate_game(game, player, policy, dice_source, collections=COLLECTIONS):
+    """
+    Replay a game with policy playing for player ("Player 1" or "Player 2").
+    dice_source supplies rerolls the log has no result for; its substream is
+    keyed by round. Returns the replayed rounds and final score.
+    """
+    collection = collections[game["collection"]]
+    dice_types, target = collection["dice"], collection["target"]
+    score = dict.fromkeys(PLAYERS, 0)
+    rounds = []
+    for round_data in game["rounds"]:
+        sums = {}
+        for seat, name in enumerate(turn_order(round_data)):
+            log = round_data[name]["log"]
+            if name == player:
+                # Moving second, the substitute knows the first mover's final sum
+                opponent_sum = next(iter(sums.values())) if seat else None
+                rolls = resimulate_turn(policy, log, dice_types, dice_source.substream(round_data["round"]),
+                                        opponent_sum)
+            else:
+                rolls, _, _ = replay_turn(log)
+            sums[name] = sum(rolls)
+        winner, points = _score(sums, target)
+        for name in PLAYERS:
+            score[name] += points[name]
+        rounds.append({"round": round_data["round"], "order": turn_order(round_data), "sums": sums,
+                       "winner": winner})
+    return {"collection": game["collection"], "rounds": rounds, "final_score": score}
+
+
+# --- Bulk processing ---
+
+def _match_result(score, player):
+    other = PLAYERS[1 - PLAYERS.index(player)]
+    return "wins" if score[player] > score[other] else "losses" if score[player] < score[other] else "draws"
+
+
+def _log_key(path, chunk_size=1 << 20):
+    # CRC-32 of the log file's bytes
+    crc = 0
+    with open(path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            crc = zlib.crc32(chunk, crc)
+    return crc
+
+
+def _process_log(path, player=None, spec=None, seed=0):
+    """
+    Replay every game in one log and, with spec, re-simulate it with that
+    policy for player. Returns summed counts, from player's side where a
+    player is given.
+    """
+    totals = {"games": 0, "rounds": 0, "mismatched_games": 0, "mismatches": 0}
+    policies = {}
+    source = DiceSource(seed).substream(_log_key(path))
+    for game_num, game in enumerate(read_game_log(path)):
+        replayed = replay_game(game)
+        totals["games"] += 1
+        totals["rounds"] += len(replayed["rounds"])
+        totals["mismatches"] += len(replayed["mismatches"])
+        totals["mismatched_games"] += bool(replayed["mismatches"])
+        if player is None:
+            continue
+        key = f"logged_{_match_result(replayed['final_score'], player)}"
+        totals[key] = totals.get(key, 0) + 1
+        totals["logged_points"] = totals.get("logged_points", 0) + replayed["final_score"][player]
+        if spec is None:
+            continue
+        if game["collection"] not in policies:
+            collection = COLLECTIONS[game["collection"]]
+            policies[game["collection"]] = make_policy(spec, collection["dice"], collection["target"],
+                                                       max(collection["rerolls"]))
+        result = resimulate_game(game, player, policies[game["collection"]], source.substream(game_num))
+        key = f"resim_{_match_result(result['final_score'], player)}"
+        totals[key] = totals.get(key, 0) + 1
+        totals["resim_points"] = totals.get("resim_points", 0) + result["final_score"][player]
+    return totals
+
+
+def process_logs(log_paths, player=None, spec=None, workers=None, seed=0):
+    """
+    Replay (and, with spec, re-simulate) every game of every log across a
+    process pool, one log per task. Returns the summed counts.
+    """
+    totals = {}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_process_log, path, player, spec, seed) for path in log_paths]
+        for future in futures:
+            for name, count in future.result().items():
+                totals[name] = totals.get(name, 0) + count
+    return totals
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay Battle Dice game logs and re-simulate them with a new policy.")
+    parser.add_argument("logs", nargs="+", help=".json, .jsonl or .bdl game logs")
+    parser.add_argument("--player", choices=PLAYERS, default=None, help="player to report on or substitute")
+    parser.add_argument("--policy", default=None,
+                        help='substitute policy for --player: "heuristic", "random", "table", "response" or '
+                             '"dqn:<model_path>"')
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=0, help="seed for rerolls the logs have no result for")
+    parser.add_argument("--show", action="store_true", help="print each replayed game's mismatches")
+    args = parser.parse_args()
+    if args.policy and not args.player:
+        parser.error("--policy needs --player")
+
+    if args.show:
+        for path in args.logs:
+            for game in read_game_log(path):
+                replayed = replay_game(game)
+                print(f"{path} Collection {game['collection']}: final score {replayed['final_score']}")
+                for mismatch in replayed["mismatches"]:
+                    print(f"  mismatch {mismatch}")
+
+    totals = process_logs(args.logs, args.player, args.policy, args.workers, args.seed)
+    print(f"{totals['games']} games, {totals['rounds']} rounds, {totals['mismatches']} mismatches "
+          f"in {totals['mismatched_games']} games")
+    if args.player:
+        for prefix, label in (("logged", "Logged"), ("resim", f"With {args.policy}")):
+            if f"{prefix}_points" not in totals:
+                continue
+            games = totals["games"]
+            rates = "  ".join(f"{name} {totals.get(f'{prefix}_{name}', 0) / games:.4f}"
+                              for name in ("wins", "draws", "losses"))
+            print(f"{label:<24} {args.player}: {rates}  mean points {totals[f'{prefix}_points'] / games:.3f}")
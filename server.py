@@ -0,0 +1,300 @@
+import argparse
+import asyncio
+import json
+import random
+import time
+from collections import defaultdict
+import numpy as np
+from battle_dice import COLLECTIONS, determine_round_winner
+from dice import default_source
+from game_log import JsonlLogSink
+
+# --- Multi-session game server ---
+#
+# Serves human-vs-AI matches with the play_game rules over newline-delimited
+# JSON on a TCP or Unix socket, many sessions per process. The client plays
+# Player 1 and moves first in odd rounds.
+#
+# Server -> client: {"type": "hello"}, {"type": "round"}, {"type": "your_turn"}
+#   (answer {"action": "reroll", "index": i} or {"action": "stop"}),
+#   {"type": "ai_turn"}, {"type": "round_result"}, {"type": "game_over"},
+#   {"type": "error"}.
+# Client -> server: {"type": "start", "collection": "A"} to begin a game.
+#
+# AI decisions from all sessions are queued and resolved together each
+# scheduling tick with one vectorized lookup in the compiled policy tables.
+
+ROUNDS = 7
+
+
+class SessionClosed(Exception):
+    pass
+
+
+class InferenceBatcher:
+    """
+    Collects pending AI decisions and answers them in batches. A full queue
+    makes callers wait, which pushes back on sessions when inference lags.
+    """
+    def __init__(self, max_pending=8192, max_batch=4096, batch_window=0.0):
+        self.pending = asyncio.Queue(max_pending)
+        self.max_batch = max_batch
+        self.batch_window = batch_window
+        self.batches = 0
+        self.decisions = 0
+
+    async def decide(self, table, rolls, rerolls_left, prefix=()):
+        # prefix holds leading table indices, e.g. the opponent sum for response tables
+        future = asyncio.get_running_loop().create_future()
+        await self.pending.put((table, list(prefix) + [r - 1 for r in rolls] + [rerolls_left], future))
+        return await future
+
+    async def run(self):
+        while True:
+            batch = [await self.pending.get()]
+            # Let every session that is ready this tick enqueue its decision
+            await asyncio.sleep(self.batch_window)
+            while len(batch) < self.max_batch and not self.pending.empty():
+                batch.append(self.pending.get_nowait())
+
+            by_table = defaultdict(list)
+            for item in batch:
+                by_table[id(item[0])].append(item)
+            for items in by_table.values():
+                try:
+                    table = items[0][0]
+                    index = np.array([index for _, index, _ in items])
+                    actions = table[tuple(index.T)].tolist()
+                except Exception as e:
+                    # Fail this batch's sessions, keep serving the others
+                    for _, _, future in items:
+                        if not future.done():
+                            future.set_exception(e)
+                    continue
+                for (_, _, future), action in zip(items, actions):
+                    if not future.done():
+                        future.set_result(action)
+            self.batches += 1
+            self.decisions += len(batch)
+
+
+class GameServer:
+    def __init__(self, max_sessions=10000, idle_timeout=60.0, log_path=None, batch_window=0.0, response=True):
+        from registry import load_ai_player
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.sessions = 0
+        self.games_played = 0
+        self.batcher = InferenceBatcher(batch_window=batch_window)
+        self.log_sink = JsonlLogSink(log_path) if log_path else None
+        self.dice_source = default_source()
+        self.tables = {}
+        self.response_tables = {}
+        for key in COLLECTIONS:
+            player = load_ai_player(key, COLLECTIONS, response=response)
+            self.tables[key] = player.policy_table
+            self.response_tables[key] = player.response_table
+
+    async def send(self, writer, message):
+        writer.write((json.dumps(message, separators=(",", ":")) + "\n").encode())
+        # Slow readers stall only their own session
+        await asyncio.wait_for(writer.drain(), self.idle_timeout)
+
+    async def receive(self, reader):
+        try:
+            line = await asyncio.wait_for(reader.readline(), self.idle_timeout)
+        except asyncio.TimeoutError:
+            raise SessionClosed("timed out")
+        if not line:
+            raise SessionClosed("disconnected")
+        try:
+            message = json.loads(line)
+        except ValueError:
+            return {}
+        # Anything but a JSON object is treated like an unreadable message
+        return message if isinstance(message, dict) else {}
+
+    async def handle(self, reader, writer):
+        if self.sessions >= self.max_sessions:
+            await self.send(writer, {"type": "error", "message": "server full"})
+            writer.close()
+            return
+        self.sessions += 1
+        try:
+            await self.send(writer, {"type": "hello", "collections": sorted(COLLECTIONS)})
+            while True:
+                message = await self.receive(reader)
+                collection = message.get("collection")
+                if message.get("type") != "start" or not isinstance(collection, str) or collection not in COLLECTIONS:
+                    await self.send(writer, {"type": "error", "message": "expected start with a valid collection"})
+                    continue
+                await self.play_game(reader, writer, collection)
+        except (SessionClosed, ConnectionError, asyncio.TimeoutError):
+            pass
+        finally:
+            self.sessions -= 1
+            writer.close()
+
+    async def human_turn(self, reader, writer, dice_types, rerolls):
+        rolls = self.dice_source.roll_dice(dice_types)
+        log = [{"roll": rolls[:], "dice": dice_types, "sum": sum(rolls), "rerolls_left": rerolls}]
+        while rerolls > 0:
+            await self.send(writer, {"type": "your_turn", "rolls": rolls, "dice": dice_types,
+                                     "sum": sum(rolls), "rerolls_left": rerolls})
+            message = await self.receive(reader)
+            if message.get("action") == "stop":
+                break
+            index = message.get("index")
+            if message.get("action") != "reroll" or type(index) is not int or index not in range(len(dice_types)):
+                await self.send(writer, {"type": "error", "message": "expected reroll with a die index, or stop"})
+                continue
+            log.append(self._reroll(rolls, index, dice_types, rerolls - 1))
+            rerolls -= 1
+        return sum(rolls), log
+
+    async def ai_turn(self, coll_key, dice_types, rerolls, opponent_sum=None):
+        rolls = self.dice_source.roll_dice(dice_types)
+        log = [{"roll": rolls[:], "dice": dice_types, "sum": sum(rolls), "rerolls_left": rerolls}]
+        table, prefix = self.tables[coll_key], ()
+        if opponent_sum is not None and self.response_tables[coll_key] is not None:
+            # Moving second: best-reply to the human's known final sum
+            table, prefix = self.response_tables[coll_key], (opponent_sum,)
+        while rerolls > 0:
+            action = await self.batcher.decide(table, rolls, rerolls, prefix)
+            if action == len(dice_types):
+                break
+            log.append(self._reroll(rolls, action, dice_types, rerolls - 1))
+            rerolls -= 1
+        return sum(rolls), log
+
+    def _reroll(self, rolls, index, dice_types, rerolls_left):
+        old_val = rolls[index]
+        rolls[index] = self.dice_source.roll(dice_types[index])
+        return {"roll": rolls[:], "dice": dice_types, "sum": sum(rolls), "rerolls_left": rerolls_left,
+                "reroll_info": {"index": index, "old": old_val, "new": rolls[index]}}
+
+    async def play_game(self, reader, writer, coll_key):
+        collection = COLLECTIONS[coll_key]
+        dice_types, target = collection["dice"], collection["target"]
+        sink = None
+        if self.log_sink:
+            # Every game gets its own sink on the shared log file
+            sink = JsonlLogSink(self.log_sink.path, file=self.log_sink.file)
+            sink.start_game(coll_key, dice_types, target)
+        final_score = {"Player 1": 0, "Player 2": 0}
+        player_order = ["Player 1", "Player 2"]
+        for round_num in range(1, ROUNDS + 1):
+            await self.send(writer, {"type": "round", "round": round_num, "first": player_order[0]})
+            sums, logs = {}, {}
+            for player, rerolls in zip(player_order, collection["rerolls"]):
+                if player == "Player 1":
+                    sums[player], logs[player] = await self.human_turn(reader, writer, dice_types, rerolls)
+                else:
+                    sums[player], logs[player] = await self.ai_turn(coll_key, dice_types, rerolls,
+                                                                    sums.get("Player 1"))
+                    await self.send(writer, {"type": "ai_turn", "log": logs[player]})
+            winner, p1_pts, p2_pts = determine_round_winner(sums["Player 1"], sums["Player 2"], target)
+            final_score["Player 1"] += p1_pts
+            final_score["Player 2"] += p2_pts
+            round_data = {"round": round_num}
+            for player in player_order:
+                round_data[player] = {"log": logs[player], "final_sum": sums[player]}
+            round_data["winner"] = f"Player {winner}" if winner else "Draw"
+            if sink:
+                sink.write_round(round_data)
+            await self.send(writer, {"type": "round_result", "round": round_num, "sums": sums,
+                                     "winner": round_data["winner"], "score": final_score})
+            # Alternate order
+            player_order.reverse()
+        if sink:
+            sink.end_game(final_score)
+        self.games_played += 1
+        await self.send(writer, {"type": "game_over", "final_score": final_score})
+
+    async def serve(self, host="127.0.0.1", port=8765, unix_path=None):
+        batcher_task = asyncio.create_task(self.batcher.run())
+        if unix_path:
+            server = await asyncio.start_unix_server(self.handle, path=unix_path)
+        else:
+            server = await asyncio.start_server(self.handle, host, port, backlog=1024)
+        print(f"Serving Battle Dice on {unix_path or f'{host}:{port}'}")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            batcher_task.cancel()
+
+
+# --- Load generator ---
+
+async def _client(host, port, unix_path, games, collection, latencies):
+    if unix_path:
+        reader, writer = await asyncio.open_unix_connection(unix_path)
+    else:
+        reader, writer = await asyncio.open_connection(host, port)
+
+    async def receive():
+        line = await reader.readline()
+        if not line:
+            raise ConnectionError("server closed the connection")
+        return json.loads(line)
+
+    message = await receive()
+    if message["type"] == "error":
+        raise ConnectionError(message["message"])
+    for _ in range(games):
+        writer.write(json.dumps({"type": "start", "collection": collection}).encode() + b"\n")
+        sent = time.perf_counter()
+        while True:
+            message = await receive()
+            latencies.append(time.perf_counter() - sent)
+            if message["type"] == "game_over":
+                break
+            if message["type"] == "your_turn":
+                # Simple human stand-in: reroll the largest die while over the target
+                rolls = message["rolls"]
+                if message["sum"] > COLLECTIONS[collection]["target"] and random.random() < 0.9:
+                    reply = {"action": "reroll", "index": rolls.index(max(rolls))}
+                else:
+                    reply = {"action": "stop"}
+                writer.write(json.dumps(reply).encode() + b"\n")
+                await writer.drain()
+                sent = time.perf_counter()
+    writer.close()
+
+
+async def run_load(sessions=100, games=10, collection="A", host="127.0.0.1", port=8765, unix_path=None):
+    latencies = []
+    start = time.perf_counter()
+    results = await asyncio.gather(*(_client(host, port, unix_path, games, collection, latencies)
+                                     for _ in range(sessions)), return_exceptions=True)
+    elapsed = time.perf_counter() - start
+    failures = [r for r in results if isinstance(r, Exception)]
+    completed = (sessions - len(failures)) * games
+    p50, p99 = np.percentile(latencies, [50, 99]) * 1000 if latencies else (0.0, 0.0)
+    print(f"{sessions} sessions, {completed} games in {elapsed:.2f}s ({completed / elapsed:.1f} games/s), "
+          f"message latency p50 {p50:.2f} ms p99 {p99:.2f} ms, {len(failures)} failed sessions")
+    return {"games": completed, "elapsed_s": elapsed, "failures": len(failures)}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Battle Dice multi-session server and load generator.")
+    parser.add_argument("mode", choices=["serve", "loadgen"])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix", help="Unix socket path instead of TCP")
+    parser.add_argument("--max-sessions", type=int, default=10000)
+    parser.add_argument("--timeout", type=float, default=60.0, help="per-session idle timeout in seconds")
+    parser.add_argument("--log", help="append played games to this .jsonl log")
+    parser.add_argument("--no-response", action="store_true",
+                        help="the AI moving second plays its model without using the client's final sum")
+    parser.add_argument("--sessions", type=int, default=100, help="loadgen: concurrent sessions")
+    parser.add_argument("--games", type=int, default=10, help="loadgen: games per session")
+    parser.add_argument("--collection", default="A", choices=sorted(COLLECTIONS))
+    args = parser.parse_args()
+
+    if args.mode == "serve":
+        server = GameServer(args.max_sessions, args.timeout, args.log, response=not args.no_response)
+        asyncio.run(server.serve(args.host, args.port, args.unix))
+    else:
+        asyncio.run(run_load(args.sessions, args.games, args.collection, args.host, args.port, args.unix))
@@ -0,0 +1,108 @@
+import numpy as np
+
+# --- Exact reroll policy solver ---
+#
+# A turn is fully described by the current rolls and the rerolls left, so the
+# optimal reroll decision can be computed exactly by expectimax over that grid.
+# Tables are indexed as table[roll_0 - 1, roll_1 - 1, ..., rerolls_left].
+# Actions follow the DQN encoding: 0..n-1 rerolls that die, n stops.
+#
+# The second mover already knows the first mover's final sum, so its exact
+# response table gets one more leading index for that sum:
+# response[opponent_sum, roll_0 - 1, ..., rerolls_left].
+
+
+def score_values(dice_types, target):
+    # Round score for every reachable final sum (index = sum), bust scores -1
+    max_sum = sum(dice_types)
+    sums = np.arange(max_sum + 1)
+    return np.where(sums <= target, sums, -1).astype(np.float64)
+
+
+def sum_grid(dice_types):
+    # Sum of the rolls for every cell of the rolls grid
+    grid = np.zeros(tuple(dice_types), dtype=np.int64)
+    for axis, sides in enumerate(dice_types):
+        shape = [1] * len(dice_types)
+        shape[axis] = sides
+        grid = grid + np.arange(1, sides + 1).reshape(shape)
+    return grid
+
+
+def solve_policy(dice_types, target, max_rerolls, terminal_values=None):
+    """
+    Expectimax over (rolls, rerolls_left).
+    terminal_values: value of ending the turn on each final sum (index = sum),
+    defaults to the round score used by determine_round_winner. Leading axes
+    of terminal_values solve several problems at once.
+    Returns (policy, values): int8 actions and float64 expected values, both
+    of shape (*leading, *dice_types, max_rerolls + 1).
+    """
+    if terminal_values is None:
+        terminal_values = score_values(dice_types, target)
+    n = len(dice_types)
+    terminal_values = np.asarray(terminal_values, dtype=np.float64)
+    lead = terminal_values.ndim - 1
+    stop_values = terminal_values[..., sum_grid(dice_types)]
+
+    policy = np.full(stop_values.shape + (max_rerolls + 1,), n, dtype=np.int8)
+    values = np.empty(stop_values.shape + (max_rerolls + 1,), dtype=np.float64)
+    values[..., 0] = stop_values
+
+    for k in range(1, max_rerolls + 1):
+        prev = values[..., k - 1]
+        # Stop is listed first so ties keep the remaining rerolls unused
+        candidates = [stop_values]
+        for axis in range(n):
+            # Rerolling die `axis` averages the next layer over its faces
+            candidates.append(np.broadcast_to(prev.mean(axis=lead + axis, keepdims=True), prev.shape))
+        stacked = np.stack(candidates)
+        best = stacked.argmax(axis=0)
+        policy[..., k] = np.where(best == 0, n, best - 1)
+        values[..., k] = stacked.max(axis=0)
+    return policy, values
+
+
+def response_points(dice_types, target):
+    """
+    Round points (win 2, draw 1, loss 0, as in determine_round_winner) of the
+    second mover, indexed [opponent_sum, own_sum].
+    """
+    scores = score_values(dice_types, target)
+    return np.sign(scores[None, :] - scores[:, None]) + 1
+
+
+def solve_response_policy(dice_types, target, max_rerolls):
+    # Best reply to every possible opponent final sum, solved in one pass
+    return solve_policy(dice_types, target, max_rerolls, response_points(dice_types, target))
+
+
+def policy_action(policy, rolls, rerolls_left):
+    return int(policy[tuple(r - 1 for r in rolls) + (rerolls_left,)])
+
+
+def save_policy_table(path, policy, dice_types, target):
+    np.savez_compressed(path, policy=policy, dice_types=np.asarray(dice_types), target=target)
+
+
+def load_policy_table(path, dice_types=None, target=None):
+    with np.load(path) as data:
+        policy = data["policy"]
+        if dice_types is not None and list(data["dice_types"]) != list(dice_types):
+            raise ValueError(f"Policy table {path} was solved for dice {list(data['dice_types'])}, not {list(dice_types)}")
+        if target is not None and int(data["target"]) != target:
+            raise ValueError(f"Policy table {path} was solved for target {int(data['target'])}, not {target}")
+    return policy
+
+
+if __name__ == "__main__":
+    # Solve and save a policy table for each collection
+    from battle_dice import COLLECTIONS
+    for key, collection in COLLECTIONS.items():
+        rerolls_first, rerolls_second = collection["rerolls"]
+        policy, values = solve_policy(collection["dice"], collection["target"],
+                                      max_rerolls=max(rerolls_first, rerolls_second))
+        save_policy_table(f"battle_dice_policy_{key}.npz", policy, collection["dice"], collection["target"])
+        print(f"Collection {key}: expected score with {rerolls_first} rerolls {values[..., rerolls_first].mean():.3f}, "
+              f"with {rerolls_second} rerolls {values[..., rerolls_second].mean():.3f}; "
+              f"saved battle_dice_policy_{key}.npz")
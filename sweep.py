@@ -0,0 +1,227 @@
+import argparse
+import contextlib
+import csv
+import hashlib
+import inspect
+import json
+import math
+import multiprocessing as mp
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# --- Hyperparameter sweeps for train_dqn ---
+#
+# A search space maps train_dqn arguments (plus "num_envs" and "seed") to a
+# list of values, or for random search to {"uniform": [lo, hi]},
+# {"loguniform": [lo, hi]} or {"randint": [lo, hi]}. Every config trains one
+# seeded VecBattleDiceEnv run in a spawned worker pinned to its own CPUs with
+# BLAS/torch threads capped, and is scored exactly against the heuristic with
+# analysis.match_probabilities. Results are appended to results.jsonl in the
+# output directory, keyed by a hash of the config, so reruns skip finished
+# configs.
+#
+# numpy and torch are only imported inside workers, after the thread limits
+# are in place.
+
+ENV_KEYS = ("num_envs", "seed")
+THREAD_ENV_VARS = ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS")
+
+
+def expand_grid(space):
+    # Every combination of the listed values, in a stable order
+    configs = [{}]
+    for name in sorted(space):
+        configs = [dict(config, **{name: value}) for config in configs for value in space[name]]
+    return configs
+
+
+def _sample(spec, rng):
+    if isinstance(spec, list):
+        return rng.choice(spec)
+    (kind, (low, high)), = spec.items()
+    if kind == "uniform":
+        return rng.uniform(low, high)
+    if kind == "loguniform":
+        return math.exp(rng.uniform(math.log(low), math.log(high)))
+    if kind == "randint":
+        return rng.randint(low, high)
+    raise ValueError(f"Unknown distribution {kind!r}")
+
+
+def sample_random(space, num_samples, seed=0):
+    rng = random.Random(seed)
+    return [{name: _sample(space[name], rng) for name in sorted(space)} for _ in range(num_samples)]
+
+
+def validate_space(space):
+    from train_ai import train_dqn
+    allowed = set(inspect.signature(train_dqn).parameters) - {"env", "callbacks", "model_path"}
+    unknown = set(space) - allowed - set(ENV_KEYS)
+    if unknown:
+        raise ValueError(f"Not train_dqn parameters: {sorted(unknown)}")
+
+
+def config_id(config):
+    return hashlib.sha256(json.dumps(config, sort_keys=True).encode()).hexdigest()[:12]
+
+
+# --- Workers ---
+
+def _init_worker(next_slot, cpus, threads):
+    # Runs once per worker process: claim a CPU slot, pin to it, cap threads
+    with next_slot.get_lock():
+        slot = next_slot.value
+        next_slot.value += 1
+    mine = cpus[slot * threads % len(cpus):][:threads] or cpus[:threads]
+    if hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, mine)
+    for name in THREAD_ENV_VARS:
+        os.environ[name] = str(threads)
+    import torch
+    torch.set_num_threads(threads)
+    torch.set_num_interop_threads(1)
+
+
+def evaluate_model(model_path, collection):
+    """
+    Exact match probabilities of the model's greedy policy against the
+    heuristic over full matches, from the model's side.
+    """
+    from ai_player import BattleDiceAIPlayer
+    from analysis import match_probabilities
+    from policies import HeuristicPolicy
+    dice_types, target, rerolls = collection["dice"], collection["target"], collection["rerolls"]
+    player = BattleDiceAIPlayer(dice_types, target, model_path, max_rerolls=max(rerolls),
+                                cache_dir=os.path.dirname(model_path))
+    result = match_probabilities(player, HeuristicPolicy(dice_types, target), dice_types, target, rerolls)
+    win, draw, loss = result["match"]
+    return {"score": win + 0.5 * draw, "match_win": win, "match_draw": draw,
+            "round_win_first": result["round_as_first"][0], "round_win_second": result["round_as_second"][0]}
+
+
+def run_job(config, collection, out_dir):
+    import numpy as np
+    import torch
+    from train_ai import VecBattleDiceEnv, train_dqn
+    job_id = config_id(dict(config, collection=collection))
+    params = {name: value for name, value in config.items() if name not in ENV_KEYS}
+    seed = config.get("seed", 0)
+    random.seed(seed)
+    np.random.seed(seed)
+    torch.manual_seed(seed)
+    rerolls_first, rerolls_second = collection["rerolls"]
+    env = VecBattleDiceEnv(collection["dice"], collection["target"], config.get("num_envs", 64),
+                           rerolls_first, rerolls_second, seed=seed)
+    model_path = os.path.join(out_dir, f"{job_id}.pth")
+    start = time.perf_counter()
+    with open(os.path.join(out_dir, f"{job_id}.log"), "w") as log, contextlib.redirect_stdout(log):
+        train_dqn(env, model_path=model_path, report_every=10 ** 9, **params)
+    train_s = time.perf_counter() - start
+    row = {"id": job_id, **config, "train_s": round(train_s, 2), "cpus": sorted(os.sched_getaffinity(0))
+           if hasattr(os, "sched_getaffinity") else None}
+    row.update(evaluate_model(model_path, collection))
+    return row
+
+
+# --- Results ---
+
+def load_results(out_dir):
+    path = os.path.join(out_dir, "results.jsonl")
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def format_table(rows, sort_by="score", descending=True, limit=None):
+    # Rows missing the sort column go last
+    present = sorted((row for row in rows if row.get(sort_by) is not None), key=lambda row: row[sort_by],
+                     reverse=descending)
+    rows = present + [row for row in rows if row.get(sort_by) is None]
+    rows = rows[:limit] if limit else rows
+    columns = [name for name in dict.fromkeys(key for row in rows for key in row) if name != "cpus"]
+
+    def cell(value):
+        return f"{value:.4g}" if isinstance(value, float) else str(value)
+    widths = {name: max(len(name), *(len(cell(row.get(name, ""))) for row in rows)) for name in columns}
+    lines = ["  ".join(name.ljust(widths[name]) for name in columns)]
+    lines += ["  ".join(cell(row.get(name, "")).ljust(widths[name]) for name in columns) for row in rows]
+    return "\n".join(lines)
+
+
+def write_csv(rows, path):
+    columns = list(dict.fromkeys(key for row in rows for key in row))
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=columns)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def run_sweep(configs, collection, out_dir, workers=None, threads=1):
+    """
+    Train and evaluate every config not already in out_dir/results.jsonl,
+    one process per job slot, and return all result rows.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    done = {row["id"] for row in load_results(out_dir)}
+    pending = [config for config in configs if config_id(dict(config, collection=collection)) not in done]
+    print(f"{len(configs)} configs, {len(configs) - len(pending)} already done, {len(pending)} to run")
+    if pending:
+        cpus = sorted(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else list(range(os.cpu_count()))
+        workers = workers or max(1, len(cpus) // threads)
+        ctx = mp.get_context("spawn")
+        next_slot = ctx.Value("i", 0)
+        with ProcessPoolExecutor(workers, mp_context=ctx, initializer=_init_worker,
+                                 initargs=(next_slot, cpus, threads)) as pool, \
+                open(os.path.join(out_dir, "results.jsonl"), "a") as results:
+            futures = {pool.submit(run_job, config, collection, out_dir): config for config in pending}
+            for finished, future in enumerate(as_completed(futures), 1):
+                try:
+                    row = future.result()
+                except Exception as e:
+                    print(f"[{finished}/{len(pending)}] failed {futures[future]}: {type(e).__name__}: {e}")
+                    continue
+                # One line per finished job, so an interrupted sweep keeps its results
+                results.write(json.dumps(row) + "\n")
+                results.flush()
+                print(f"[{finished}/{len(pending)}] {row['id']} score {row['score']:.4f} ({row['train_s']:.1f}s)")
+    return load_results(out_dir)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Parallel train_dqn hyperparameter sweep.")
+    parser.add_argument("space", help='JSON search space file, e.g. {"lr": [1e-3, 3e-4], "gamma": [0.9, 0.99]}')
+    parser.add_argument("--collection", default="A")
+    parser.add_argument("--search", choices=["grid", "random"], default="grid")
+    parser.add_argument("--samples", type=int, default=20, help="random search: number of configs")
+    parser.add_argument("--search-seed", type=int, default=0)
+    parser.add_argument("--seeds", type=int, default=1, help="training seeds per config")
+    parser.add_argument("--episodes", type=int, default=None, help="num_episodes unless set in the space")
+    parser.add_argument("--workers", type=int, default=None, help="default: one per --threads CPUs")
+    parser.add_argument("--threads", type=int, default=1, help="CPUs and torch threads per job")
+    parser.add_argument("--out", default=None, help="default: sweeps/<collection>")
+    parser.add_argument("--sort", default="score")
+    parser.add_argument("--ascending", action="store_true")
+    parser.add_argument("--top", type=int, default=None)
+    parser.add_argument("--table-only", action="store_true", help="print existing results without training")
+    args = parser.parse_args()
+
+    from battle_dice import COLLECTIONS
+    collection = COLLECTIONS[args.collection]
+    out_dir = args.out or os.path.join("sweeps", args.collection)
+    if args.table_only:
+        rows = load_results(out_dir)
+    else:
+        with open(args.space) as f:
+            space = json.load(f)
+        validate_space(space)
+        configs = expand_grid(space) if args.search == "grid" else sample_random(space, args.samples, args.search_seed)
+        if args.episodes is not None:
+            configs = [dict({"num_episodes": args.episodes}, **config) for config in configs]
+        if "seed" not in space:
+            configs = [dict(config, seed=seed) for config in configs for seed in range(args.seeds)]
+        rows = run_sweep(configs, collection, out_dir, args.workers, args.threads)
+        write_csv(rows, os.path.join(out_dir, "results.csv"))
+    print(format_table(rows, args.sort, not args.ascending, args.top))
@@ -0,0 +1,112 @@
+import argparse
+import math
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor
+from battle_dice import COLLECTIONS, determine_round_winner
+from dice import DiceSource, default_source
+from policies import make_policy, play_policy_turn
+
+# --- Headless tournament simulator ---
+#
+# Plays full 7-round matches with the play_game rules: the first mover gets 3
+# rerolls and the second 2 (or the collection's budgets), the order alternates
+# each round, and rounds are scored with determine_round_winner.
+
+ROUNDS = 7
+REROLLS_FIRST = 3
+REROLLS_SECOND = 2
+
+
+def play_match(policy_1, policy_2, dice_types, target, dice_source=None, rerolls=(REROLLS_FIRST, REROLLS_SECOND)):
+    # Returns the match points of (policy_1, policy_2)
+    rerolls_first, rerolls_second = rerolls
+    points = [0, 0]
+    policies = (policy_1, policy_2)
+    first = 0
+    for _ in range(ROUNDS):
+        second = 1 - first
+        sums = [0, 0]
+        sums[first] = sum(play_policy_turn(policies[first], dice_types, rerolls_first, dice_source))
+        # The second mover plays knowing the first mover's final sum
+        sums[second] = sum(play_policy_turn(policies[second], dice_types, rerolls_second, dice_source, sums[first]))
+        _, pts_1, pts_2 = determine_round_winner(sums[0], sums[1], target)
+        points[0] += pts_1
+        points[1] += pts_2
+        # Alternate order
+        first = second
+    return points
+
+
+def _run_chunk(spec_1, spec_2, dice_types, target, num_matches, seed, chunk, rerolls=(REROLLS_FIRST, REROLLS_SECOND)):
+    # Each chunk gets its own substream of the tournament seed
+    dice_source = default_source()
+    if seed is not None:
+        dice_source = DiceSource(seed).substream(chunk)
+        random.seed(f"{seed}-{chunk}")
+    policy_1 = make_policy(spec_1, dice_types, target, max(rerolls))
+    policy_2 = make_policy(spec_2, dice_types, target, max(rerolls))
+    wins = draws = losses = 0
+    for _ in range(num_matches):
+        p1, p2 = play_match(policy_1, policy_2, dice_types, target, dice_source, rerolls)
+        if p1 > p2:
+            wins += 1
+        elif p2 > p1:
+            losses += 1
+        else:
+            draws += 1
+    return wins, draws, losses
+
+
+def wilson_interval(successes, n, z=1.96):
+    if n == 0:
+        return 0.0, 1.0
+    p = successes / n
+    denom = 1 + z * z / n
+    centre = (p + z * z / (2 * n)) / denom
+    half = z * math.sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / denom
+    return max(0.0, centre - half), min(1.0, centre + half)
+
+
+def run_tournament(spec_1, spec_2, collection_key="A", num_matches=100000, workers=None,
+                   chunks_per_worker=4, seed=None):
+    """
+    Play num_matches matches of spec_1 against spec_2 across a process pool.
+    Returns win/draw/loss counts and rates from spec_1's point of view, each
+    rate with a 95% Wilson confidence interval.
+    """
+    collection = COLLECTIONS[collection_key]
+    workers = workers or os.cpu_count()
+    num_chunks = min(num_matches, workers * chunks_per_worker) or 1
+    sizes = [num_matches // num_chunks + (1 if i < num_matches % num_chunks else 0) for i in range(num_chunks)]
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_run_chunk, spec_1, spec_2, collection["dice"], collection["target"], size, seed, i,
+                               collection["rerolls"])
+                   for i, size in enumerate(sizes)]
+        counts = [f.result() for f in futures]
+
+    totals = dict(zip(("wins", "draws", "losses"), (sum(c[i] for c in counts) for i in range(3))))
+    result = {"policy_1": spec_1, "policy_2": spec_2, "collection": collection_key, "matches": num_matches}
+    for name, count in totals.items():
+        result[name] = count
+        result[f"{name}_rate"] = count / num_matches if num_matches else 0.0
+        result[f"{name}_ci95"] = wilson_interval(count, num_matches)
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Headless Battle Dice tournament between two policies.")
+    parser.add_argument("policy_1", help='"heuristic", "random", "table", "response" or "dqn:<model_path>"')
+    parser.add_argument("policy_2", help="same choices as policy_1")
+    parser.add_argument("--collection", default="A", choices=sorted(COLLECTIONS))
+    parser.add_argument("--matches", type=int, default=100000)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    result = run_tournament(args.policy_1, args.policy_2, args.collection, args.matches, args.workers, seed=args.seed)
+    print(f"{args.policy_1} vs {args.policy_2} on Collection {args.collection}, {args.matches} matches")
+    for name in ("wins", "draws", "losses"):
+        low, high = result[f"{name}_ci95"]
+        print(f"  {name:<6} {result[f'{name}_rate']:.4f}  (95% CI {low:.4f} - {high:.4f})")
@@ -1,18 +1,30 @@
+import os
 import random
 import numpy as np
 import torch
 import torch.nn as nn
 import torch.optim as optim
-from collections import deque, namedtuple
+from collections import namedtuple
+from training_metrics import TrainingMetrics, MetricsFileWriter, no_phase
+from checkpoint import (AsyncCheckpointer, checkpoint_paths, latest_checkpoint, load_checkpoint, snapshot_module,
+                        snapshot_optimizer)
+from dice import DiceSource, default_source
+from evaluation import BackgroundEvaluator
 
 # --- Environment & Game Logic ---
 
 class BattleDiceEnv:
-    def __init__(self, dice_types, target, max_rerolls_first=3, max_rerolls_second=2):
+    def __init__(self, dice_types, target, max_rerolls_first=3, max_rerolls_second=2, dice_source=None):
+        self.dice_source = dice_source or default_source()
         self.dice_types = dice_types
         self.target = target
         self.max_rerolls_first = max_rerolls_first
         self.max_rerolls_second = max_rerolls_second
+        # rerolls_left is scaled by the larger budget so either seat's state stays within [0, 1]
+        self.rerolls_scale = max(max_rerolls_first, max_rerolls_second)
+        # Rolls, rerolls left, dice types and target in; reroll one die or stop out
+        self.state_dim = 2 * len(dice_types) + 2
+        self.num_actions = len(dice_types) + 1
         self.reset()
 
     def reset(self):
@@ -35,16 +47,16 @@ class BattleDiceEnv:
         return self.state
 
     def roll_die(self, sides):
-        return random.randint(1, sides)
+        return self.dice_source.roll(sides)
 
     def _get_state(self):
-        # State: current rolls (3 dice), rerolls left, dice types, target
+        # State: current rolls, rerolls left, dice types, target
         # Normalize rolls and dice types by max dice side for stable input
         max_side = max(self.dice_types)
-        # We'll encode state as numpy float array of shape (12,)
+        # We'll encode state as numpy float array of shape (state_dim,)
         # [rolls..., rerolls_left, dice_types..., target_norm]
         rolls_norm = [r / max_side for r in self.rolls[self.current_player]]
-        rerolls_norm = [self.rerolls_left[self.current_player] / self.max_rerolls_first]
+        rerolls_norm = [self.rerolls_left[self.current_player] / self.rerolls_scale]
         dice_norm = [d / max_side for d in self.dice_types]
         target_norm = [self.target / (max_side * len(self.dice_types))]
         state = np.array(rolls_norm + rerolls_norm + dice_norm + target_norm, dtype=np.float32)
@@ -52,14 +64,14 @@ class BattleDiceEnv:
 
     def step(self, action):
         """
-        action: int 0,1,2 for reroll that die, or 3 for pass (no reroll)
+        action: int 0..n-1 for reroll that die, or n for pass (no reroll)
         Returns: next_state, reward, done, info
         """
 
         if self.done:
             raise Exception("Episode is done. Call reset().")
 
-        if action == 3:  # pass, end turn
+        if action == len(self.dice_types):  # pass, end turn
             self.turn_done = True
         else:
             # reroll chosen die if rerolls left
@@ -98,6 +110,13 @@ class BattleDiceEnv:
         # If turn not done, reward=0, done=False
         return self.state, 0.0, False, {}
 
+    def state_dict(self):
+        # Checkpoints are taken between episodes, so the dice stream is the only state
+        return {"dice_source": self.dice_source.state_dict()}
+
+    def load_state_dict(self, state):
+        self.dice_source.load_state_dict(state["dice_source"])
+
     def _heuristic_play(self):
         # Heuristic rerolls intelligently with max rerolls_second
         rerolls_left = self.max_rerolls_second
@@ -142,6 +161,237 @@ class BattleDiceEnv:
         return reward, done
 
 
+class VecBattleDiceEnv:
+    """
+    N independent BattleDiceEnv games held in NumPy arrays and stepped together.
+    Finished games are reset automatically; their terminal states are returned
+    in info["final_state"].
+    """
+    def __init__(self, dice_types, target, num_envs=64, max_rerolls_first=3, max_rerolls_second=2, seed=None,
+                 dice_source=None):
+        self.dice_types = dice_types
+        self.target = target
+        self.num_envs = num_envs
+        self.max_rerolls_first = max_rerolls_first
+        self.max_rerolls_second = max_rerolls_second
+        self.rerolls_scale = max(max_rerolls_first, max_rerolls_second)
+        self.state_dim = 2 * len(dice_types) + 2
+        self.num_actions = len(dice_types) + 1
+        # Rolls are drawn in bulk straight from the dice source's generator
+        self.dice_source = dice_source or DiceSource(seed)
+        self.sides = np.asarray(dice_types, dtype=np.int64)
+        max_side = max(dice_types)
+        # Constant part of the state: dice types and target
+        self.state_tail = np.array([d / max_side for d in dice_types] +
+                                   [target / (max_side * len(dice_types))], dtype=np.float32)
+        self.max_side = max_side
+        self.agent_rolls = np.zeros((num_envs, len(dice_types)), dtype=np.int64)
+        self.heuristic_rolls = np.zeros((num_envs, len(dice_types)), dtype=np.int64)
+        self.rerolls_left = np.zeros(num_envs, dtype=np.int64)
+        self.reset()
+
+    @property
+    def rng(self):
+        # Looked up on every draw, so reseeding the dice source reaches the env
+        return self.dice_source.rng
+
+    def state_dict(self):
+        return {"rng": self.rng.bit_generator.state, "agent_rolls": self.agent_rolls.copy(),
+                "heuristic_rolls": self.heuristic_rolls.copy(), "rerolls_left": self.rerolls_left.copy()}
+
+    def load_state_dict(self, state):
+        # In place, so a generator shared with a DiceSource stays shared
+        self.rng.bit_generator.state = state["rng"]
+        self.agent_rolls[:] = state["agent_rolls"]
+        self.heuristic_rolls[:] = state["heuristic_rolls"]
+        self.rerolls_left[:] = state["rerolls_left"]
+
+    def _roll(self, count):
+        # count x n_dice matrix of fresh rolls
+        return self.rng.integers(1, self.sides + 1, size=(count, len(self.dice_types)))
+
+    def _reset_envs(self, mask):
+        count = int(mask.sum())
+        self.agent_rolls[mask] = self._roll(count)
+        self.heuristic_rolls[mask] = self._roll(count)
+        self.rerolls_left[mask] = self.max_rerolls_first
+
+    def reset(self):
+        self._reset_envs(np.ones(self.num_envs, dtype=bool))
+        return self._get_states(self.agent_rolls, self.rerolls_left)
+
+    def _get_states(self, rolls, rerolls_left):
+        n = len(self.dice_types)
+        states = np.empty((len(rolls), 2 * n + 2), dtype=np.float32)
+        states[:, :n] = rolls / self.max_side
+        states[:, n] = rerolls_left / self.rerolls_scale
+        states[:, n + 1:] = self.state_tail
+        return states
+
+    def step(self, actions):
+        """
+        actions: int array of shape (num_envs,), same encoding as BattleDiceEnv.step
+        Returns: next_states, rewards, dones, info
+        """
+        actions = np.asarray(actions)
+        n = len(self.dice_types)
+        turn_done = (actions == n) | (self.rerolls_left <= 0)
+
+        reroll = np.flatnonzero(~turn_done)
+        if len(reroll):
+            idx = actions[reroll]
+            self.agent_rolls[reroll, idx] = self.rng.integers(1, self.sides[idx] + 1)
+            self.rerolls_left[reroll] -= 1
+
+        rewards = np.zeros(self.num_envs, dtype=np.float32)
+        final_states = None
+        if turn_done.any():
+            # Heuristic plays immediately and the round is scored
+            self._heuristic_play(turn_done)
+            rewards[turn_done] = self._calculate_reward(turn_done)
+            final_states = self._get_states(self.heuristic_rolls[turn_done],
+                                            np.full(int(turn_done.sum()), self.max_rerolls_second))
+            self._reset_envs(turn_done)
+
+        next_states = self._get_states(self.agent_rolls, self.rerolls_left)
+        return next_states, rewards, turn_done, {"final_state": final_states}
+
+    def _heuristic_play(self, mask):
+        # Vectorized BattleDiceEnv._heuristic_play for the games in mask
+        rows = np.flatnonzero(mask)
+        rolls = self.heuristic_rolls[rows]
+        active = np.ones(len(rows), dtype=bool)
+        for _ in range(self.max_rerolls_second):
+            current_sum = rolls.sum(axis=1)
+            too_high = current_sum > self.target
+            too_low = current_sum < self.target - 4
+            active &= too_high | too_low
+            if not active.any():
+                break
+            # argmax/argmin pick the first occurrence, like list.index
+            idx = np.where(too_high, rolls.argmax(axis=1), rolls.argmin(axis=1))
+            sel = np.flatnonzero(active)
+            rolls[sel, idx[sel]] = self.rng.integers(1, self.sides[idx[sel]] + 1)
+        self.heuristic_rolls[rows] = rolls
+
+    def _calculate_reward(self, mask):
+        agent_sum = self.agent_rolls[mask].sum(axis=1)
+        heuristic_sum = self.heuristic_rolls[mask].sum(axis=1)
+        s_agent = np.where(agent_sum <= self.target, agent_sum, -1)
+        s_heuristic = np.where(heuristic_sum <= self.target, heuristic_sum, -1)
+        # Win 2, draw 1, loss -1, as in BattleDiceEnv._calculate_reward
+        return np.select([s_agent > s_heuristic, s_agent < s_heuristic], [2.0, -1.0], default=1.0)
+
+
+def heuristic_table(dice_types, target, max_rerolls):
+    # BattleDiceEnv._heuristic_play as a policy table
+    n = len(dice_types)
+    rolls = np.indices(tuple(dice_types)).reshape(n, -1).T + 1
+    current_sum = rolls.sum(axis=1)
+    actions = np.where(current_sum > target, rolls.argmax(axis=1),
+                       np.where(current_sum < target - 4, rolls.argmin(axis=1), n))
+    table = np.repeat(actions.reshape(tuple(dice_types) + (1,)), max_rerolls + 1, axis=-1)
+    table[..., 0] = n
+    return table
+
+
+class LeagueBattleDiceEnv(VecBattleDiceEnv):
+    """
+    VecBattleDiceEnv for league self-play. The agent alternates seats between
+    consecutive games of each env, as play_game alternates the order: first
+    mover with max_rerolls_first, or second mover with max_rerolls_second
+    after the opponent's full turn. Every game draws its opponent from a pool
+    of frozen policy tables: the heuristic (slot 0, with heuristic_prob) or
+    one of up to pool_size past snapshots added with add_opponent. Opponents
+    play by table lookup for all games at once, so they cost no forward
+    passes. heuristic_rolls holds the opponent's rolls.
+    """
+    def __init__(self, dice_types, target, num_envs=64, max_rerolls_first=3, max_rerolls_second=2, seed=None,
+                 dice_source=None, pool_size=8, heuristic_prob=0.2):
+        self.heuristic_prob = heuristic_prob
+        self.pool_count = 0
+        self.pool_next = 0
+        self.agent_first = np.arange(num_envs) % 2 == 1
+        self.opponents = np.zeros(num_envs, dtype=np.int64)
+        self.max_rerolls = max(max_rerolls_first, max_rerolls_second)
+        self.pool = np.empty((1 + pool_size,) + tuple(dice_types) + (self.max_rerolls + 1,), dtype=np.int8)
+        self.pool[0] = heuristic_table(dice_types, target, self.max_rerolls)
+        super().__init__(dice_types, target, num_envs, max_rerolls_first, max_rerolls_second, seed, dice_source)
+
+    def add_opponent(self, weights):
+        # Freeze DQN weights into the pool, replacing the oldest snapshot when full
+        from evaluation import compile_env_policy
+        self.pool[1 + self.pool_next] = compile_env_policy(weights, self)
+        self.pool_next = (self.pool_next + 1) % (len(self.pool) - 1)
+        self.pool_count = min(self.pool_count + 1, len(self.pool) - 1)
+
+    def state_dict(self):
+        state = super().state_dict()
+        state.update(pool=self.pool.copy(), pool_count=self.pool_count, pool_next=self.pool_next,
+                     agent_first=self.agent_first.copy(), opponents=self.opponents.copy())
+        return state
+
+    def load_state_dict(self, state):
+        super().load_state_dict(state)
+        self.pool[:] = state["pool"]
+        self.pool_count = state["pool_count"]
+        self.pool_next = state["pool_next"]
+        self.agent_first[:] = state["agent_first"]
+        self.opponents[:] = state["opponents"]
+
+    def _reset_envs(self, mask):
+        count = int(mask.sum())
+        self.agent_first[mask] = ~self.agent_first[mask]
+        self.agent_rolls[mask] = self._roll(count)
+        self.heuristic_rolls[mask] = self._roll(count)
+        snapshot = self.rng.random(count) >= self.heuristic_prob
+        self.opponents[mask] = np.where(snapshot & (self.pool_count > 0),
+                                        1 + self.rng.integers(0, max(self.pool_count, 1), size=count), 0)
+        self.rerolls_left[mask] = np.where(self.agent_first[mask], self.max_rerolls_first, self.max_rerolls_second)
+        # Opponents moving first finish their turn before the agent starts
+        self._opponent_play(mask & ~self.agent_first, self.max_rerolls_first)
+
+    def _opponent_play(self, mask, rerolls):
+        # One pool lookup per reroll for every opponent in mask
+        rows = np.flatnonzero(mask)
+        rolls = self.heuristic_rolls[rows]
+        tables = self.opponents[rows]
+        n = len(self.dice_types)
+        active = np.ones(len(rows), dtype=bool)
+        for rerolls_left in range(rerolls, 0, -1):
+            actions = self.pool[(tables,) + tuple((rolls - 1).T) + (rerolls_left,)].astype(np.int64)
+            active &= actions != n
+            if not active.any():
+                break
+            sel = np.flatnonzero(active)
+            idx = actions[sel]
+            rolls[sel, idx] = self.rng.integers(1, self.sides[idx] + 1)
+        self.heuristic_rolls[rows] = rolls
+
+    def step(self, actions):
+        actions = np.asarray(actions)
+        n = len(self.dice_types)
+        turn_done = (actions == n) | (self.rerolls_left <= 0)
+
+        reroll = np.flatnonzero(~turn_done)
+        if len(reroll):
+            idx = actions[reroll]
+            self.agent_rolls[reroll, idx] = self.rng.integers(1, self.sides[idx] + 1)
+            self.rerolls_left[reroll] -= 1
+
+        rewards = np.zeros(self.num_envs, dtype=np.float32)
+        final_states = None
+        if turn_done.any():
+            # Opponents moving second play now and the round is scored
+            self._opponent_play(turn_done & self.agent_first, self.max_rerolls_second)
+            rewards[turn_done] = self._calculate_reward(turn_done)
+            final_states = self._get_states(self.agent_rolls[turn_done], self.rerolls_left[turn_done])
+            self._reset_envs(turn_done)
+
+        next_states = self._get_states(self.agent_rolls, self.rerolls_left)
+        return next_states, rewards, turn_done, {"final_state": final_states}
+
+
 # --- Neural Network for DQN ---
 
 class DQN(nn.Module):
@@ -164,35 +414,355 @@ class DQN(nn.Module):
 Transition = namedtuple('Transition', ('state', 'action', 'reward', 'next_state', 'done'))
 
 class ReplayBuffer:
-    def __init__(self, capacity=10000):
-        self.memory = deque(maxlen=capacity)
+    """
+    Ring buffer with preallocated fixed-dtype columns.
+    sample() returns a Transition of ready-to-use torch tensors.
+    """
+    def __init__(self, capacity=10000, state_dim=8):
+        self.capacity = capacity
+        self.states = np.zeros((capacity, state_dim), dtype=np.float32)
+        self.actions = np.zeros(capacity, dtype=np.int64)
+        self.rewards = np.zeros(capacity, dtype=np.float32)
+        self.next_states = np.zeros((capacity, state_dim), dtype=np.float32)
+        self.dones = np.zeros(capacity, dtype=np.bool_)
+        self.pos = 0
+        self.size = 0
+
+    def push(self, state, action, reward, next_state, done):
+        i = self.pos
+        self.states[i] = state
+        self.actions[i] = action
+        self.rewards[i] = reward
+        self.next_states[i] = next_state
+        self.dones[i] = done
+        self.pos = (i + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+
+    def push_batch(self, states, actions, rewards, next_states, dones):
+        n = len(states)
+        if n > self.capacity:
+            # Only the newest `capacity` transitions would survive anyway
+            states, actions, rewards, next_states, dones = (
+                x[-self.capacity:] for x in (states, actions, rewards, next_states, dones))
+            n = self.capacity
+        idx = (self.pos + np.arange(n)) % self.capacity
+        self.states[idx] = states
+        self.actions[idx] = actions
+        self.rewards[idx] = rewards
+        self.next_states[idx] = next_states
+        self.dones[idx] = dones
+        self.pos = (self.pos + n) % self.capacity
+        self.size = min(self.size + n, self.capacity)
+
+    def sample(self, batch_size, device=None):
+        # Uniform sampling with replacement; fancy indexing copies once per column
+        idx = np.random.randint(0, self.size, size=batch_size)
+        return Transition(
+            torch.from_numpy(self.states[idx]).to(device),
+            torch.from_numpy(self.actions[idx]).to(device),
+            torch.from_numpy(self.rewards[idx]).to(device),
+            torch.from_numpy(self.next_states[idx]).to(device),
+            torch.from_numpy(self.dones[idx]).to(device),
+        )
 
-    def push(self, *args):
-        self.memory.append(Transition(*args))
+    def __len__(self):
+        return self.size
+
+    def state_dict(self):
+        return {"states": self.states.copy(), "actions": self.actions.copy(), "rewards": self.rewards.copy(),
+                "next_states": self.next_states.copy(), "dones": self.dones.copy(),
+                "pos": self.pos, "size": self.size}
+
+    def load_state_dict(self, state):
+        if state["states"].shape != self.states.shape:
+            raise ValueError(f"Replay buffer shape {state['states'].shape} does not match {self.states.shape}")
+        for name in ("states", "actions", "rewards", "next_states", "dones"):
+            getattr(self, name)[:] = state[name]
+        self.pos = state["pos"]
+        self.size = state["size"]
+
+
+class SumTree:
+    """
+    Array-backed binary sum-tree over `capacity` leaf priorities: leaves sit
+    at tree[leaves:leaves + capacity] and every node holds the sum of its two
+    children. Updates and prefix-sum lookups are batched, O(log n) each.
+    """
+    def __init__(self, capacity):
+        self.leaves = 1 << max(capacity - 1, 1).bit_length()
+        self.depth = self.leaves.bit_length() - 1
+        self.tree = np.zeros(2 * self.leaves, dtype=np.float64)
+
+    def total(self):
+        return self.tree[1]
+
+    def get(self, idx):
+        return self.tree[self.leaves + np.asarray(idx)]
+
+    def update(self, idx, priorities):
+        nodes = self.leaves + np.asarray(idx)
+        # Duplicate indices keep the last priority, as sequential updates would;
+        # duplicate parents just recompute the same sum
+        self.tree[nodes] = priorities
+        tree = self.tree
+        for _ in range(self.depth):
+            nodes = nodes >> 1
+            tree[nodes] = tree[2 * nodes] + tree[2 * nodes + 1]
+
+    def find(self, values):
+        # Leaf index of the first prefix sum exceeding each value
+        nodes = np.ones(len(values), dtype=np.int64)
+        values = np.array(values, dtype=np.float64)
+        tree = self.tree
+        for _ in range(self.depth):
+            nodes <<= 1
+            left_sums = tree[nodes]
+            go_right = values >= left_sums
+            values -= left_sums * go_right
+            nodes += go_right
+        return nodes - self.leaves
+
+
+class PrioritizedReplayBuffer(ReplayBuffer):
+    """
+    Proportional prioritized replay (Schaul et al.): transitions are sampled
+    with probability p_i^alpha / sum p^alpha and come with importance-sampling
+    weights whose exponent beta anneals to 1 over beta_steps samples. New
+    transitions get the largest priority seen so far.
+    """
+    def __init__(self, capacity=10000, state_dim=8, alpha=0.6, beta_start=0.4, beta_steps=100000, eps=1e-3):
+        super().__init__(capacity, state_dim)
+        self.tree = SumTree(capacity)
+        self.alpha = alpha
+        self.beta_start = beta_start
+        self.beta_steps = beta_steps
+        self.eps = eps
+        self.max_priority = 1.0
+        self.samples = 0
+
+    def push(self, state, action, reward, next_state, done):
+        i = self.pos
+        super().push(state, action, reward, next_state, done)
+        self.tree.update([i], self.max_priority ** self.alpha)
+
+    def push_batch(self, states, actions, rewards, next_states, dones):
+        n = min(len(states), self.capacity)
+        idx = (self.pos + np.arange(n)) % self.capacity
+        super().push_batch(states, actions, rewards, next_states, dones)
+        self.tree.update(idx, np.full(n, self.max_priority ** self.alpha))
+
+    def beta(self):
+        return min(1.0, self.beta_start + (1.0 - self.beta_start) * self.samples / self.beta_steps)
+
+    def sample_prioritized(self, batch_size, device=None):
+        """
+        Stratified proportional sample. Returns (Transition, indices, weights),
+        indices to pass back to update_priorities and weights as a tensor.
+        """
+        total = self.tree.total()
+        segment = total / batch_size
+        values = (np.arange(batch_size) + np.random.random(batch_size)) * segment
+        idx = np.minimum(self.tree.find(np.minimum(values, total * (1 - 1e-12))), self.size - 1)
+        probs = self.tree.get(idx) / total
+        weights = (self.size * probs) ** -self.beta()
+        weights /= weights.max()
+        self.samples += batch_size
+        batch = Transition(
+            torch.from_numpy(self.states[idx]).to(device),
+            torch.from_numpy(self.actions[idx]).to(device),
+            torch.from_numpy(self.rewards[idx]).to(device),
+            torch.from_numpy(self.next_states[idx]).to(device),
+            torch.from_numpy(self.dones[idx]).to(device),
+        )
+        return batch, idx, torch.from_numpy(weights.astype(np.float32)).to(device)
 
-    def sample(self, batch_size):
-        batch = random.sample(self.memory, batch_size)
-        return Transition(*zip(*batch))
+    def state_dict(self):
+        state = super().state_dict()
+        state.update(tree=self.tree.tree.copy(), max_priority=self.max_priority, samples=self.samples,
+                     beta_steps=self.beta_steps)
+        return state
 
-    def __len__(self):
-        return len(self.memory)
+    def load_state_dict(self, state):
+        super().load_state_dict(state)
+        self.tree.tree[:] = state["tree"]
+        self.max_priority = state["max_priority"]
+        self.samples = state["samples"]
+        self.beta_steps = state["beta_steps"]
+
+    def update_priorities(self, idx, td_errors):
+        priorities = np.abs(td_errors) + self.eps
+        self.max_priority = max(self.max_priority, float(priorities.max()))
+        self.tree.update(idx, priorities ** self.alpha)
 
 
 # --- Training Loop ---
 
+def epsilon_by_step(steps_done, epsilon_start=1.0, epsilon_end=0.1, epsilon_decay=5000):
+    return epsilon_end + (epsilon_start - epsilon_end) * np.exp(-1. * steps_done / epsilon_decay)
+
+
+def optimize_model(policy_net, target_net, optimizer, memory, batch_size, gamma, device=None, metrics=None):
+    phase = metrics.phase if metrics is not None else no_phase
+    prioritized = isinstance(memory, PrioritizedReplayBuffer)
+    with phase("sample"):
+        if prioritized:
+            batch, indices, weights = memory.sample_prioritized(batch_size, device)
+        else:
+            batch = memory.sample(batch_size, device)
+
+    with phase("forward"):
+        # Compute Q(s_t, a)
+        state_action_values = policy_net(batch.state).gather(1, batch.action.unsqueeze(1)).squeeze(1)
+
+        # Compute V(s_{t+1}) for all next states, zero for terminal ones
+        with torch.no_grad():
+            next_state_values = target_net(batch.next_state).max(1)[0].masked_fill(batch.done, 0.0)
+
+        # Compute expected Q values
+        expected_state_action_values = (next_state_values * gamma) + batch.reward
+
+        # Compute loss, importance-weighted for prioritized samples
+        if prioritized:
+            td_errors = state_action_values - expected_state_action_values
+            loss = (weights * td_errors.pow(2)).mean()
+        else:
+            loss = nn.MSELoss()(state_action_values, expected_state_action_values)
+
+    with phase("backward"):
+        optimizer.zero_grad()
+        loss.backward()
+    with phase("optimizer_step"):
+        optimizer.step()
+    if prioritized:
+        with phase("priority_update"):
+            memory.update_priorities(indices, td_errors.detach().cpu().numpy())
+    loss = loss.detach()
+    if metrics is not None:
+        metrics.record_loss(loss)
+    return loss
+
+
 def train_dqn(env, num_episodes=10000, batch_size=64, gamma=0.99, lr=1e-3,
-              epsilon_start=1.0, epsilon_end=0.1, epsilon_decay=5000, target_update=100):
+              epsilon_start=1.0, epsilon_end=0.1, epsilon_decay=5000, target_update=100,
+              callbacks=(), metrics_path=None, report_every=500, model_path="battle_dice_dqn.pth",
+              prioritized=False, alpha=0.6, beta_start=0.4, checkpoint_dir=None, checkpoint_every=1000,
+              keep_checkpoints=3, resume=False, init_model=None, eval_every=None, eval_games=100000,
+              eval_seed=0, patience=None, min_delta=0.0, league_every=1000):
+    """
+    callbacks are called with a metrics dict (phase timings, steps/sec,
+    episodes/sec, loss, epsilon) every report_every episodes; metrics_path
+    also appends those reports to a .csv or .jsonl file.
+    prioritized switches to PrioritizedReplayBuffer, with beta annealed to 1
+    over the expected number of gradient steps.
+    checkpoint_dir receives a full training checkpoint every checkpoint_every
+    episodes and at the end, written in the background. resume continues
+    exactly from a checkpoint path, or from the latest one in checkpoint_dir
+    when True; init_model only warm-starts the weights from a saved model.
+    eval_every scores the greedy policy against the heuristic over eval_games
+    seeded rounds every eval_every episodes on a background thread, keeps the
+    best weights in <model_path stem>_best.npz and, with patience, stops
+    after that many evaluations without a gain above min_delta.
+    With a LeagueBattleDiceEnv, the current policy joins the env's opponent
+    pool every league_every episodes and evaluations average both seats.
+    Returns a summary dict: episodes trained, best evaluation and its path.
+    """
     device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-
-    policy_net = DQN().to(device)
-    target_net = DQN().to(device)
+    callbacks = list(callbacks)
+    if metrics_path is not None:
+        callbacks.append(MetricsFileWriter(metrics_path))
+    metrics = TrainingMetrics(callbacks, report_every)
+    phase = metrics.phase
+
+    policy_net = DQN(env.state_dim, env.num_actions).to(device)
+    target_net = DQN(env.state_dim, env.num_actions).to(device)
     target_net.load_state_dict(policy_net.state_dict())
     target_net.eval()
 
     optimizer = optim.Adam(policy_net.parameters(), lr=lr)
-    memory = ReplayBuffer()
+    if prioritized:
+        memory = PrioritizedReplayBuffer(state_dim=env.state_dim, alpha=alpha, beta_start=beta_start,
+                                         beta_steps=batch_size * num_episodes)
+    else:
+        memory = ReplayBuffer(state_dim=env.state_dim)
+
+    if init_model is not None:
+        from ai_player import load_weights
+        weights = {name: torch.from_numpy(array) for name, array in load_weights(init_model).items()}
+        policy_net.load_state_dict(weights)
+        target_net.load_state_dict(weights)
 
     steps_done = 0
+    epsilon = epsilon_start
+    start_episode = 0
+    states = None
+    eval_state = None
+    if resume:
+        if resume is True:
+            # Nothing to resume from without a checkpoint_dir
+            checkpoint_path = latest_checkpoint(checkpoint_dir) if checkpoint_dir is not None else None
+        else:
+            checkpoint_path = resume
+        if checkpoint_path is not None:
+            checkpoint = load_checkpoint(checkpoint_path)
+            policy_net.load_state_dict(checkpoint["policy_net"])
+            target_net.load_state_dict(checkpoint["target_net"])
+            optimizer.load_state_dict(checkpoint["optimizer"])
+            memory.load_state_dict(checkpoint["memory"])
+            env.load_state_dict(checkpoint["env"])
+            random.setstate(checkpoint["random_state"])
+            np.random.set_state(checkpoint["numpy_state"])
+            torch.set_rng_state(checkpoint["torch_state"])
+            steps_done = checkpoint["steps_done"]
+            epsilon = checkpoint["epsilon"]
+            start_episode = checkpoint["episode"]
+            states = checkpoint["states"]
+            eval_state = checkpoint.get("evaluator")
+            print(f"Resumed from {checkpoint_path} at episode {start_episode}")
+
+    checkpointer = AsyncCheckpointer(checkpoint_dir, keep_checkpoints) if checkpoint_dir is not None else None
+
+    evaluator = None
+    best_model_path = None
+    if eval_every is not None:
+        def make_eval_env():
+            # Same rules as training, same dice for every evaluation
+            return VecBattleDiceEnv(env.dice_types, env.target, eval_games, env.max_rerolls_first,
+                                    env.max_rerolls_second, seed=eval_seed)
+        best_model_path = f"{os.path.splitext(model_path)[0]}_best.npz"
+        # League agents play both seats, so they are scored in both
+        evaluator = BackgroundEvaluator(make_eval_env, best_model_path, patience, min_delta,
+                                        both_seats=isinstance(env, LeagueBattleDiceEnv))
+        if eval_state is not None:
+            evaluator.load_state_dict(eval_state)
+
+    def run_evaluation(before, after):
+        # Submit a snapshot when crossing an eval_every boundary; True once training should stop
+        if after // eval_every > before // eval_every:
+            evaluator.submit(after, {name: tensor.detach().cpu().numpy().copy()
+                                     for name, tensor in policy_net.state_dict().items()})
+        for result in evaluator.poll():
+            print(f"Eval at episode {result['episode']}: win {result['win_rate']:.4f} "
+                  f"draw {result['draw_rate']:.4f} (best {evaluator.best['score']:.4f} "
+                  f"at episode {evaluator.best['episode']})")
+        return evaluator.should_stop
+
+    def save_checkpoint(episode, states=None):
+        # Snapshot in memory now, serialize and write on the checkpointer thread
+        checkpointer.save(episode, {
+            "policy_net": snapshot_module(policy_net),
+            "target_net": snapshot_module(target_net),
+            "optimizer": snapshot_optimizer(optimizer),
+            "memory": memory.state_dict(),
+            "env": env.state_dict(),
+            "random_state": random.getstate(),
+            "numpy_state": np.random.get_state(),
+            "torch_state": torch.get_rng_state(),
+            "steps_done": steps_done,
+            "epsilon": epsilon,
+            "episode": episode,
+            "states": None if states is None else states.copy(),
+            "evaluator": None if evaluator is None else evaluator.state_dict(),
+        })
 
     def select_action(state, epsilon):
         nonlocal steps_done
@@ -204,79 +774,161 @@ def train_dqn(env, num_episodes=10000, batch_size=64, gamma=0.99, lr=1e-3,
                 q_values = policy_net(state_t)
                 return q_values.argmax().item()
         else:
-            return random.randrange(4)
-
-    epsilon = epsilon_start
+            return random.randrange(env.num_actions)
 
-    for episode in range(num_episodes):
-        state = env.reset()
-        total_reward = 0
-        done = False
-
-        while not done:
-            action = select_action(state, epsilon)
-            next_state, reward, done, _ = env.step(action)
-            memory.push(state, action, reward, next_state, done)
-            state = next_state
-            total_reward += reward
-
-            if len(memory) >= batch_size:
-                transitions = memory.sample(batch_size)
-                batch = Transition(*transitions)
-
-                non_final_mask = torch.tensor(
-                    tuple(map(lambda d: not d, batch.done)),
-                    device=device, dtype=torch.bool
-                )
-                non_final_next_states = torch.stack(
-                    [torch.tensor(s, dtype=torch.float32).to(device) for s, d in zip(batch.next_state, batch.done) if not d]
-                ) if any(non_final_mask) else torch.empty((0, 12), device=device)
-
-                state_batch = torch.stack([torch.tensor(s, dtype=torch.float32).to(device) for s in batch.state])
-                action_batch = torch.tensor(batch.action, device=device).unsqueeze(1)
-                reward_batch = torch.tensor(batch.reward, device=device, dtype=torch.float32)
-
-                # Compute Q(s_t, a)
-                state_action_values = policy_net(state_batch).gather(1, action_batch)
-
-                # Compute V(s_{t+1}) for all next states.
-                next_state_values = torch.zeros(batch_size, device=device)
-                if non_final_next_states.size(0) > 0:
-                    next_state_values[non_final_mask] = target_net(non_final_next_states).max(1)[0].detach()
-
-                # Compute expected Q values
-                expected_state_action_values = (next_state_values * gamma) + reward_batch
-
-                # Compute loss
-                loss = nn.MSELoss()(state_action_values.squeeze(), expected_state_action_values)
-
-                optimizer.zero_grad()
-                loss.backward()
-                optimizer.step()
-
-            # Decay epsilon
-            epsilon = epsilon_end + (epsilon_start - epsilon_end) * np.exp(-1. * steps_done / epsilon_decay)
-
-        if episode % 500 == 0:
-            print(f"Episode {episode} total reward: {total_reward:.2f} epsilon: {epsilon:.2f}")
-            # Update target network
-            target_net.load_state_dict(policy_net.state_dict())
+    def select_actions(states, epsilon):
+        # Batched epsilon-greedy for VecBattleDiceEnv
+        nonlocal steps_done
+        steps_done += len(states)
+        with torch.no_grad():
+            q_values = policy_net(torch.from_numpy(states).to(device))
+            actions = q_values.argmax(1).cpu().numpy()
+        explore = np.random.random(len(states)) <= epsilon
+        actions[explore] = np.random.randint(env.num_actions, size=int(explore.sum()))
+        return actions
+
+    completed = False
+    try:
+        if isinstance(env, VecBattleDiceEnv):
+            # One batched env step and one gradient step per iteration
+            if states is None:
+                states = env.reset()
+            league = isinstance(env, LeagueBattleDiceEnv) and league_every
+            episode = start_episode
+            while episode < num_episodes:
+                with phase("select_action"):
+                    actions = select_actions(states, epsilon)
+                with phase("env_step"):
+                    next_states, rewards, dones, info = env.step(actions)
+                with phase("memory_push"):
+                    stored_next = next_states.copy()
+                    if dones.any():
+                        stored_next[dones] = info["final_state"]
+                    memory.push_batch(states, actions, rewards, stored_next, dones)
+                metrics.record_steps(env.num_envs)
+                states = next_states
+
+                if len(memory) >= batch_size:
+                    optimize_model(policy_net, target_net, optimizer, memory, batch_size, gamma, device, metrics)
+
+                epsilon = epsilon_by_step(steps_done, epsilon_start, epsilon_end, epsilon_decay)
+
+                finished = int(dones.sum())
+                if finished and (episode + finished) // 500 > episode // 500:
+                    print(f"Episode {episode + finished} mean reward: {rewards[dones].mean():.2f} epsilon: {epsilon:.2f}")
+                    # Update target network
+                    with phase("target_update"):
+                        target_net.load_state_dict(policy_net.state_dict())
+                if league and (episode + finished) // league_every > episode // league_every:
+                    with phase("league_snapshot"):
+                        env.add_opponent({name: tensor.detach().cpu().numpy()
+                                          for name, tensor in policy_net.state_dict().items()})
+                if checkpointer is not None and (episode + finished) // checkpoint_every > episode // checkpoint_every:
+                    save_checkpoint(episode + finished, states)
+                episode += finished
+                if finished:
+                    metrics.end_episodes(finished, float(rewards[dones].sum()), epsilon)
+                if evaluator is not None and finished and run_evaluation(episode - finished, episode):
+                    print(f"Early stop at episode {episode}: no improvement in {patience} evaluations")
+                    break
+        else:
+            for episode in range(start_episode, num_episodes):
+                state = env.reset()
+                total_reward = 0
+                done = False
+
+                while not done:
+                    with phase("select_action"):
+                        action = select_action(state, epsilon)
+                    with phase("env_step"):
+                        next_state, reward, done, _ = env.step(action)
+                    with phase("memory_push"):
+                        memory.push(state, action, reward, next_state, done)
+                    metrics.record_steps()
+                    state = next_state
+                    total_reward += reward
+
+                    if len(memory) >= batch_size:
+                        optimize_model(policy_net, target_net, optimizer, memory, batch_size, gamma, device, metrics)
+
+                    # Decay epsilon
+                    epsilon = epsilon_by_step(steps_done, epsilon_start, epsilon_end, epsilon_decay)
+
+                if episode % 500 == 0:
+                    print(f"Episode {episode} total reward: {total_reward:.2f} epsilon: {epsilon:.2f}")
+                    # Update target network
+                    with phase("target_update"):
+                        target_net.load_state_dict(policy_net.state_dict())
+                metrics.end_episodes(1, total_reward, epsilon)
+                if checkpointer is not None and (episode + 1) % checkpoint_every == 0:
+                    save_checkpoint(episode + 1)
+                if evaluator is not None and run_evaluation(episode, episode + 1):
+                    print(f"Early stop at episode {episode + 1}: no improvement in {patience} evaluations")
+                    episode += 1
+                    break
+            else:
+                episode = max(num_episodes, start_episode)
+
+        if checkpointer is not None:
+            # A final checkpoint lets a later run extend this one
+            save_checkpoint(episode, states if isinstance(env, VecBattleDiceEnv) else None)
+        completed = True
+    finally:
+        # Flushes the pending checkpoint and evaluation even when training is interrupted;
+        # a failed write is only raised when it would not mask a training error
+        try:
+            if checkpointer is not None:
+                checkpointer.close(raise_error=completed)
+        finally:
+            if evaluator is not None:
+                evaluator.close(raise_error=completed)
 
     # Save trained model
-    torch.save(policy_net.state_dict(), "battle_dice_dqn.pth")
-    print("Training complete, model saved as battle_dice_dqn.pth")
+    torch.save(policy_net.state_dict(), model_path)
+    print(f"Training complete, model saved as {model_path}")
+    best = None
+    if evaluator is not None:
+        run_evaluation(episode, episode)
+        best = evaluator.best
+        if best is not None:
+            print(f"Best evaluation: score {best['score']:.4f} at episode {best['episode']}, saved as {best_model_path}")
+    return {"episodes": episode, "best_eval": best, "best_model_path": best_model_path if best else None}
 
 if __name__ == "__main__":
-    # Train and save a DQN for each collection (A and B)
-    collections = {
-        "A": {"dice": [4, 8, 12], "target": 14},
-        "B": {"dice": [6, 10, 20], "target": 21}
-    }
-    for key, collection in collections.items():
+    # Train and publish a DQN for every registered collection that has no model yet;
+    # collection keys given on the command line are retrained regardless. Interrupted
+    # runs resume from their latest checkpoint.
+    import argparse
+    from battle_dice import COLLECTIONS
+    from registry import ArtifactCache, ModelRegistry
+    parser = argparse.ArgumentParser(description="Train and publish Battle Dice DQN models.")
+    parser.add_argument("collections", nargs="*", help="collections to retrain even if a model exists")
+    parser.add_argument("--league", action="store_true",
+                        help="self-play league in both seats against past snapshots and the heuristic")
+    parser.add_argument("--episodes", type=int, default=10000)
+    args = parser.parse_args()
+    cache = ArtifactCache()
+    models = ModelRegistry(cache)
+    for key, collection in COLLECTIONS.items():
+        if cache.find_model(collection, key) is not None and key not in args.collections:
+            print(f"Collection {key}: using model {cache.find_model(collection, key)}")
+            continue
         print(f"\n=== Training DQN for Collection {key} ===")
-        env = BattleDiceEnv(collection["dice"], collection["target"])
-        train_dqn(env)
-        # Rename the saved model to include the collection key
-        import os
-        os.rename("battle_dice_dqn.pth", f"battle_dice_dqn_{key}.pth")
-        print(f"Model for Collection {key} saved as battle_dice_dqn_{key}.pth")
+        rerolls_first, rerolls_second = collection["rerolls"]
+        if args.league:
+            env = LeagueBattleDiceEnv(collection["dice"], collection["target"], 64, rerolls_first, rerolls_second)
+        else:
+            env = BattleDiceEnv(collection["dice"], collection["target"], rerolls_first, rerolls_second)
+        model_path = cache.path(collection, "dqn.pth")
+        checkpoint_dir = cache.path(collection, "checkpoints")
+        summary = train_dqn(env, num_episodes=args.episodes, model_path=model_path, checkpoint_dir=checkpoint_dir,
+                            resume=True, eval_every=1000, patience=5)
+        # Publish the best evaluated snapshot rather than the last weights
+        best = summary["best_eval"]
+        version = models.publish(collection, summary["best_model_path"] or model_path, tags=["latest"],
+                                 trainer="train_dqn", league=args.league, episodes=summary["episodes"],
+                                 eval_score=best and best["score"], eval_episode=best and best["episode"])
+        print(f"Model for Collection {key} published as v{version}")
+        # The next training run of this collection starts fresh
+        for path in checkpoint_paths(checkpoint_dir):
+            os.remove(path)
@@ -0,0 +1,118 @@
+import csv
+import json
+import time
+from contextlib import nullcontext
+
+# --- Training metrics ---
+#
+# Phase timers and counters for the train_dqn hot path. Reports are built
+# every report_every episodes and handed to callbacks, e.g. MetricsFileWriter.
+# On CUDA, phase times measure launch time only, since kernels run async.
+
+PHASES = ("select_action", "env_step", "memory_push", "sample", "forward", "backward",
+          "optimizer_step", "priority_update", "target_update", "league_snapshot")
+
+_NO_PHASE = nullcontext()
+
+
+class _Phase:
+    __slots__ = ("totals", "counts", "name", "start")
+
+    def __init__(self, totals, counts, name):
+        self.totals = totals
+        self.counts = counts
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc):
+        self.totals[self.name] += time.perf_counter() - self.start
+        self.counts[self.name] += 1
+
+
+def no_phase(name):
+    return _NO_PHASE
+
+
+class TrainingMetrics:
+    def __init__(self, callbacks=(), report_every=500):
+        self.callbacks = list(callbacks)
+        self.report_every = report_every
+        self.phase_totals = dict.fromkeys(PHASES, 0.0)
+        self.phase_counts = dict.fromkeys(PHASES, 0)
+        self._phases = {name: _Phase(self.phase_totals, self.phase_counts, name) for name in PHASES}
+        self.steps = 0
+        self.episodes = 0
+        self.updates = 0
+        self.loss_sum = 0.0
+        self.reward_sum = 0.0
+        self.start_time = time.perf_counter()
+        self._last = (self.start_time, 0, 0, 0)
+
+    def phase(self, name):
+        # Reused context manager, so timing a phase allocates nothing
+        return self._phases[name]
+
+    def record_steps(self, count=1):
+        self.steps += count
+
+    def record_loss(self, loss):
+        # loss may be a detached device tensor; it is summed on the device and
+        # only read back in report, so recording it does not sync every step
+        self.updates += 1
+        self.loss_sum = self.loss_sum + loss
+
+    def end_episodes(self, count, reward_sum, epsilon):
+        before = self.episodes
+        self.episodes += count
+        self.reward_sum += reward_sum
+        if self.episodes // self.report_every > before // self.report_every:
+            self.report(epsilon)
+
+    def report(self, epsilon):
+        now = time.perf_counter()
+        last_time, last_steps, last_episodes, last_updates = self._last
+        interval = max(now - last_time, 1e-9)
+        episodes = self.episodes - last_episodes
+        updates = self.updates - last_updates
+        row = {
+            "episode": self.episodes,
+            "steps": self.steps,
+            "updates": self.updates,
+            "elapsed_s": now - self.start_time,
+            "steps_per_sec": (self.steps - last_steps) / interval,
+            "episodes_per_sec": episodes / interval,
+            "mean_loss": float(self.loss_sum) / updates if updates else None,
+            "mean_reward": self.reward_sum / episodes if episodes else None,
+            "epsilon": float(epsilon),
+        }
+        for name in PHASES:
+            count = self.phase_counts[name]
+            row[f"{name}_s"] = self.phase_totals[name]
+            row[f"{name}_us"] = self.phase_totals[name] / count * 1e6 if count else None
+            self.phase_totals[name] = 0.0
+            self.phase_counts[name] = 0
+        self.loss_sum = 0.0
+        self.reward_sum = 0.0
+        self._last = (now, self.steps, self.episodes, self.updates)
+        for callback in self.callbacks:
+            callback(row)
+        return row
+
+
+class MetricsFileWriter:
+    # Callback appending each report to a .csv or .jsonl file
+    def __init__(self, path):
+        self.path = path
+        self.csv = path.endswith(".csv")
+
+    def __call__(self, row):
+        with open(self.path, "a", newline="") as f:
+            if not self.csv:
+                f.write(json.dumps(row) + "\n")
+                return
+            writer = csv.DictWriter(f, fieldnames=list(row))
+            if f.tell() == 0:
+                writer.writeheader()
+            writer.writerow(row)